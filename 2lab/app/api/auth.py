@@ -2,46 +2,80 @@ import os
 from app.core.endpoints import FastApiServerInfo
 from fastapi import APIRouter
 import secrets
-import sqlite3
+import aiosqlite
 from app.schemas.schemas import User
+from app.services.db_pool import SQLitePool
+from app.services.passwords import hash_password, verify_password
 
 DB_PATH = os.path.join('app','db','database.db')
 #"')"app/db/database.db"
+
+# Схема создаётся один раз при старте приложения, если база не создана миграциями alembic
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    );
+"""
+
+# Одинаковые строки SQL попадают в кеш подготовленных выражений соединений пула
+SELECT_BY_EMAIL = "SELECT id, email, password FROM Users WHERE email = ?"
+INSERT_USER = "INSERT INTO Users (email, password) VALUES (?, ?)"
+UPDATE_PASSWORD = "UPDATE Users SET password = ? WHERE id = ?"
+
+# Пул соединений открывается при старте приложения (init_db) и живёт до его остановки.
+# В отличие от sqlite3, aiosqlite не блокирует цикл событий на время запроса
+db_pool = SQLitePool(DB_PATH, size=FastApiServerInfo.DB_POOL_SIZE)
+
 router = APIRouter()
+
+
+async def init_db():
+    await db_pool.open(schema=SCHEMA)
+
+
+async def close_db():
+    await db_pool.close()
+
+
 # Добавление нового пользователя в бд
 @router.post(FastApiServerInfo.SIGN_UP_ENDPOINT)
 async def sign_up(user: User):
-    token, id = None, None
     existing_users = dict()
-    connection = sqlite3.connect(DB_PATH)
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM Users WHERE email = ?", 
-                   (user.email,))
-    rows = cursor.fetchall()
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(SELECT_BY_EMAIL, (user.email,))
+        rows = await cursor.fetchall()
+        await cursor.close()
     if rows:
         for row in rows:
-            id, email, password = row
-            existing_user = {
+            id, email, _ = row
+            existing_users[id] = {
                  "id": id,
                  "email": email,
              }
-            existing_users[id] = existing_user
-        pass
     else:
-        cursor.execute("INSERT INTO Users (email, password) VALUES (?, ?)", 
-                    (user.email, user.password))
-        connection.commit()
-        cursor.execute("SELECT id FROM Users WHERE email = ? AND password = ?", 
-                    (user.email, user.password))
-        id = cursor.fetchall()[0][0]
+        # Хеш считается в пуле потоков, цикл событий и соединение с БД не заняты
+        password_hash = await hash_password(user.password)
+        async with db_pool.acquire() as db:
+            try:
+                cursor = await db.execute(INSERT_USER, (user.email, password_hash))
+                await db.commit()
+            except aiosqlite.IntegrityError:
+                # Тот же email успели зарегистрировать параллельным запросом:
+                # отвечаем так же, как для уже существующего пользователя
+                cursor = await db.execute(SELECT_BY_EMAIL, (user.email,))
+                id, email, _ = await cursor.fetchone()
+                await cursor.close()
+                return {id: {"id": id, "email": email}}
+            id = cursor.lastrowid
+            await cursor.close()
         token = secrets.token_urlsafe()
         existing_users[id] = {
                 "id": id,
                 "email": user.email,
-                "token": token  
+                "token": token
             }
-        
-    connection.close()
     return existing_users
 
 logged_user = {
@@ -50,22 +84,22 @@ logged_user = {
 }
 @router.post(FastApiServerInfo.LOGIN_ENDPOINT)
 async def login(user: User):
-    token, id = None, None
-    connection = sqlite3.connect(DB_PATH)
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM Users WHERE email = ? AND password = ?", 
-                   (user.email,user.password))
-    rows = cursor.fetchone()
-    if rows:
-        id, email, password = rows
-        token = secrets.token_urlsafe()
-        logged_user["id"] = id
-        logged_user["email"] = email
-    else:
-        connection.close()
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(SELECT_BY_EMAIL, (user.email,))
+        row = await cursor.fetchone()
+        await cursor.close()
+    valid, new_hash = await verify_password(user.password, row[2] if row else None)
+    if not valid:
         return {"Message": "Incorrect password"}
-    
-    connection.close()
+    id, email, _ = row
+    if new_hash:
+        # Пароль хранился открытым текстом или с устаревшим числом раундов
+        async with db_pool.acquire() as db:
+            await db.execute(UPDATE_PASSWORD, (new_hash, id))
+            await db.commit()
+    token = secrets.token_urlsafe()
+    logged_user["id"] = id
+    logged_user["email"] = email
     return {
         "id": logged_user["id"],
         "email": logged_user["email"],
@@ -74,5 +108,5 @@ async def login(user: User):
 
 # Вывод информации об авторизованном пользователе
 @router.post(FastApiServerInfo.USER_INFO_ENDPOINT)
-async def login():
-    return logged_user
\ No newline at end of file
+async def user_info():
+    return logged_user
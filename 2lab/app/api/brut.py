@@ -1,7 +1,11 @@
 from app.core.endpoints import FastApiServerInfo
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from app.services.brut import *
+from app.services.keyspace import keyspace_size
+from app.services.tasks import RegistryFull, TaskRegistry
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 
 router = APIRouter()
@@ -10,7 +14,42 @@ router = APIRouter()
 TEMP_DIR = r"app\temp_files"
 os.makedirs(TEMP_DIR, exist_ok=True)
 
-tasks = {}
+# Задачи с атомарной выдачей id и вытеснением завершённых по TTL (см. app/services/tasks.py)
+tasks = TaskRegistry(maxsize=FastApiServerInfo.TASKS_MAX, ttl=FastApiServerInfo.TASK_TTL)
+
+# Пул потоков для подбора паролей: проверка пароля в основном ждёт процесс unrar,
+# а число одновременно выполняемых задач ограничено BRUT_WORKERS
+executor = ThreadPoolExecutor(max_workers=FastApiServerInfo.BRUT_WORKERS, thread_name_prefix="brut")
+# Ссылки на незавершённые задачи, чтобы их future не были собраны сборщиком мусора
+background_jobs = set()
+
+def run_brut(task_id, temp_file_path, charset, max_length):
+    """
+    Выполняет подбор пароля в потоке пула executor и записывает состояние в реестр tasks.
+    """
+    try:
+        tasks.update(task_id, hash=extract_rar_hash(temp_file_path))
+
+        total = keyspace_size(charset, max_length)
+
+        def counted(passwords):
+            # Прогресс обновляется по мере перебора, его видно через /get_status/
+            for checked, password in enumerate(passwords, start=1):
+                tasks.update(task_id, progress=checked * 100 // total)
+                yield password
+
+        found_password = brute_force_rar(temp_file_path, counted(generate_passwords(charset, max_length)))
+        if found_password:
+            tasks.finish(task_id, status="completed", progress=100, result=found_password)
+        else:
+            tasks.finish(task_id, status="failed", progress=100, result="null")
+    except Exception as e:
+        print(f"Ошибка в задаче {task_id}: {e}")
+        tasks.finish(task_id, status="error", result="null", detail=str(e))
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
 
 @router.post(FastApiServerInfo.BRUT_HASH)
 async def brut_file(
@@ -22,17 +61,9 @@ async def brut_file(
     if max_length > 8:
         raise HTTPException(status_code=400, detail="max_length не может превышать 8")
     try:
-        tasks[list(tasks.keys())[-1] + 1] = {
-    "status": "running",
-    "progress": 0,
-    "result": "null",
-    }
-    except:
-        tasks[1] = {
-    "status": "running",
-    "progress": 0,
-    "result": "null",
-        }
+        task_id = tasks.create(status="running", progress=0, result="null")
+    except RegistryFull:
+        raise HTTPException(status_code=503, detail="Слишком много выполняющихся задач, повторите позже")
     
     # Сохраняем загруженный файл во временную директорию.
     file_extension = os.path.splitext(file.filename)[1]
@@ -42,41 +73,25 @@ async def brut_file(
         content = await file.read()
         f.write(content)
         await file.close()
-    
-        
-    #passwords_file = 'passwords.txt'
-    
-    extract_rar_hash(temp_file_path.replace('\\\\','\\'))
-    with open(temp_file_path.split('.')[0] + '.txt', "r") as f:
-        hash_value = f.readlines()[0]
 
+    # Извлечение хеша и перебор идут в фоновом потоке: цикл событий не блокируется,
+    # и /get_status/ и авторизация отвечают, пока задача выполняется
+    future = asyncio.get_running_loop().run_in_executor(
+        executor, run_brut, task_id, temp_file_path, charset, max_length
+    )
+    background_jobs.add(future)
+    future.add_done_callback(background_jobs.discard)
 
-    
-    generate_passwords(charset, max_length, temp_file_path.split('.')[0] + '_passwords.txt')
-    found_password = brute_force_rar(temp_file_path, temp_file_path.split('.')[0] + '_passwords.txt')
-    if found_password:
-        tasks[list(tasks.keys())[-1]] = {
-        "status": "completed",
-        "progress": 100,
-        "result": found_password,
-        }
-    else:
-        tasks[list(tasks.keys())[-1]] = {
-        "status": "failed",
-        "progress": 100,
-        "result": "null",
-        }
-    os.remove(temp_file_path)
-    os.remove(temp_file_path.split('.')[0] + '.txt')
-    os.remove(temp_file_path.split('.')[0] + '_passwords.txt')
-    
     return {
-        "task_id": list(tasks.keys())[-1],
-        "hash": hash_value
+        "task_id": task_id,
+        "status": "running"
     }
 
 @router.get(FastApiServerInfo.GET_STATUS)
 async def get_status(task_id: int):
+    task = tasks.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена или уже удалена")
     return {
-        "task_id":tasks[task_id]
+        "task_id":task
     }
\ No newline at end of file
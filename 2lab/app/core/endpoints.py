@@ -10,4 +10,15 @@ class FastApiServerInfo:
     
     PORT = "8000"
     IP = "127.0.0.1"
-    PORT = 7777
\ No newline at end of file
+    PORT = 7777
+
+    # Число одновременно выполняемых задач подбора пароля
+    BRUT_WORKERS = 2
+    # Сколько задач хранится в памяти и сколько секунд хранится завершённая задача
+    TASKS_MAX = 1000
+    TASK_TTL = 3600
+    # Число соединений с SQLite в пуле приложения
+    DB_POOL_SIZE = 4
+    # Стоимость bcrypt (log2 числа раундов) и число потоков для хеширования паролей
+    BCRYPT_ROUNDS = 12
+    PASSWORD_HASH_WORKERS = 2
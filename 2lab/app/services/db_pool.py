@@ -0,0 +1,71 @@
+"""
+Пул соединений с SQLite на всё время жизни приложения.
+
+Соединения открываются один раз при старте и переиспользуются запросами, поэтому
+на запрос не тратится открытие файла и настройка соединения. sqlite3 кеширует
+подготовленные выражения внутри соединения (cached_statements), так что одинаковые
+SQL-строки на долгоживущих соединениях компилируются один раз.
+Режим WAL позволяет читать параллельно с записью, а synchronous=NORMAL убирает fsync
+на каждый commit (данные сбрасываются на диск при checkpoint WAL).
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import List
+
+import aiosqlite
+
+
+class SQLitePool:
+    def __init__(self, path: str, size: int = 4, busy_timeout: int = 5000, cached_statements: int = 256):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._connections: List[aiosqlite.Connection] = []
+        self._idle: "asyncio.Queue[aiosqlite.Connection]" = None
+
+    async def open(self, schema: str = None) -> None:
+        """
+        Открывает соединения пула. schema - DDL, выполняемый один раз при старте
+        (CREATE TABLE IF NOT EXISTS ...), если база ещё не создана миграциями.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            db = await aiosqlite.connect(self.path, cached_statements=self.cached_statements)
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+            self._connections.append(db)
+            self._idle.put_nowait(db)
+        if schema:
+            async with self.acquire() as db:
+                await db.executescript(schema)
+                await db.commit()
+
+    async def close(self) -> None:
+        for db in self._connections:
+            await db.close()
+        self._connections = []
+        self._idle = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Берёт свободное соединение, ожидая его, если все заняты.
+        Незавершённая транзакция откатывается перед возвратом соединения в пул.
+        """
+        if self._idle is None:
+            raise RuntimeError("Пул соединений с БД не открыт")
+        db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            try:
+                if db.in_transaction:
+                    await db.rollback()
+            finally:
+                self._idle.put_nowait(db)
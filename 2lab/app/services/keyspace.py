@@ -0,0 +1,78 @@
+"""
+Ленивое пространство ключей для перебора паролей.
+
+Каждому паролю длины от 1 до max_length соответствует индекс в том же порядке,
+в каком их выдаёт itertools.product (сначала все пароли длины 1, затем длины 2 и т.д.).
+Это позволяет не хранить список паролей на диске, начинать перебор с любого индекса
+и делить пространство на непересекающиеся диапазоны.
+"""
+
+
+def normalize_charset(charset):
+    """
+    Убирает повторяющиеся символы из набора, сохраняя их порядок.
+    Иначе одни и те же пароли проверялись бы несколько раз.
+    """
+    return "".join(dict.fromkeys(charset))
+
+
+def keyspace_size(charset, max_length):
+    """
+    Возвращает количество паролей длины от 1 до max_length над набором charset.
+    """
+    base = len(normalize_charset(charset))
+    return sum(base ** length for length in range(1, max_length + 1))
+
+
+def _decompose(index, base, max_length):
+    """
+    Переводит индекс в длину пароля и список позиций символов в наборе.
+    """
+    for length in range(1, max_length + 1):
+        count = base ** length
+        if index < count:
+            digits = [0] * length
+            for pos in range(length - 1, -1, -1):
+                index, digits[pos] = divmod(index, base)
+            return length, digits
+        index -= count
+    raise IndexError("Индекс выходит за пределы пространства ключей")
+
+
+def index_to_password(index, charset, max_length):
+    """
+    Возвращает пароль с заданным индексом.
+    """
+    charset = normalize_charset(charset)
+    if index < 0 or not charset:
+        raise IndexError("Индекс выходит за пределы пространства ключей")
+    _, digits = _decompose(index, len(charset), max_length)
+    return "".join(charset[d] for d in digits)
+
+
+def iter_passwords(charset, max_length, start=0, stop=None):
+    """
+    Лениво генерирует пароли с индексами из диапазона [start, stop).
+    Первый пароль выдаётся сразу, без предварительной генерации всего списка.
+    """
+    charset = normalize_charset(charset)
+    total = keyspace_size(charset, max_length)
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return
+
+    base = len(charset)
+    length, digits = _decompose(start, base, max_length)
+    for _ in range(stop - start):
+        yield "".join(charset[d] for d in digits)
+        # Увеличиваем "счётчик" на единицу, как одометр
+        pos = length - 1
+        while pos >= 0:
+            digits[pos] += 1
+            if digits[pos] < base:
+                break
+            digits[pos] = 0
+            pos -= 1
+        else:
+            length += 1
+            digits = [0] * length
@@ -0,0 +1,210 @@
+"""
+Извлечение хеша RAR3/RAR5 разбором заголовков архива, без rar2john.
+
+Читаются только заголовки блоков: данные файлов пропускаются перемещением по файлу,
+поэтому время не зависит от размера архива. Результат совпадает со строкой rar2john
+без префикса с именем файла:
+    RAR5: $rar5$<длина соли>$<соль>$<lg2 итераций>$<iv>$8$<значение проверки пароля>
+    RAR3 с зашифрованными заголовками (-hp): $RAR3$*0*<соль>*<первые 16 байт заголовка>
+    RAR3 с зашифрованными файлами: $RAR3$*1*<соль>*<crc>*<сжатый размер>*<размер>*1*<данные>*<метод>
+В RAR3 хеш строится по файлу с наименьшим сжатым размером; его данные встраиваются
+в строку, только если они не длиннее RAR3_INLINE_LIMIT, иначе указывается смещение
+данных в архиве, как это делает rar2john.
+"""
+import os
+import struct
+from typing import BinaryIO, Optional
+
+RAR3_SIGNATURE = b"Rar!\x1a\x07\x00"
+RAR5_SIGNATURE = b"Rar!\x1a\x07\x01\x00"
+RAR3_INLINE_LIMIT = 0x400
+
+# RAR3: типы блоков и флаги
+RAR3_MAIN_HEAD = 0x73
+RAR3_FILE_HEAD = 0x74
+RAR3_END_HEAD = 0x7B
+RAR3_MHD_PASSWORD = 0x0080
+RAR3_LHD_PASSWORD = 0x0004
+RAR3_LHD_LARGE = 0x0100
+RAR3_LHD_SALT = 0x0400
+RAR3_LONG_BLOCK = 0x8000
+
+# RAR5: типы заголовков, флаги и записи дополнительной области
+RAR5_FILE_HEAD = 2
+RAR5_ENCRYPTION_HEAD = 4
+RAR5_END_HEAD = 5
+RAR5_HFL_EXTRA = 0x0001
+RAR5_HFL_DATA = 0x0002
+RAR5_FHEXTRA_CRYPT = 0x01
+RAR5_CHFL_PSWCHECK = 0x0001
+RAR5_SALT_SIZE = 16
+RAR5_IV_SIZE = 16
+RAR5_PSWCHECK_SIZE = 8
+
+
+class _Reader:
+    """
+    Последовательное чтение полей из буфера заголовка.
+    """
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def take(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise ValueError("Заголовок RAR обрезан")
+        value = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return value
+
+    def vint(self) -> int:
+        # Число переменной длины RAR5: по 7 бит в байте, старший бит - продолжение
+        value = shift = 0
+        while True:
+            byte = self.take(1)[0]
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+            if shift > 63:
+                raise ValueError("Некорректное число в заголовке RAR5")
+
+
+def _read_rar5_header(f: BinaryIO):
+    """
+    Читает заголовок RAR5 в текущей позиции:
+    (тип, reader на поля, начало дополнительной области, размер данных) или None в конце файла.
+    """
+    if len(f.read(4)) < 4:  # CRC32 заголовка
+        return None
+    size_field = b""
+    while not size_field or size_field[-1] & 0x80:
+        byte = f.read(1)
+        if not byte or len(size_field) >= 3:
+            raise ValueError("Некорректный размер заголовка RAR5")
+        size_field += byte
+    header_size = _Reader(size_field).vint()
+    reader = _Reader(f.read(header_size))
+    if len(reader.data) < header_size:
+        raise ValueError("Заголовок RAR5 обрезан")
+    header_type = reader.vint()
+    flags = reader.vint()
+    extra_size = reader.vint() if flags & RAR5_HFL_EXTRA else 0
+    data_size = reader.vint() if flags & RAR5_HFL_DATA else 0
+    return header_type, reader, header_size - extra_size, data_size
+
+
+def _rar5_line(salt: bytes, lg2count: int, iv: bytes, pswcheck: bytes) -> str:
+    return f"$rar5${len(salt)}${salt.hex()}${lg2count}${iv.hex()}${len(pswcheck)}${pswcheck.hex()}"
+
+
+def _rar5_hash(f: BinaryIO) -> Optional[str]:
+    while True:
+        header = _read_rar5_header(f)
+        if header is None:
+            return None
+        header_type, reader, extra_start, data_size = header
+        if header_type == RAR5_ENCRYPTION_HEAD:
+            # Зашифрованы все заголовки: iv - первые байты следующего (зашифрованного) заголовка
+            reader.vint()
+            crypt_flags = reader.vint()
+            lg2count = reader.take(1)[0]
+            salt = reader.take(RAR5_SALT_SIZE)
+            if not crypt_flags & RAR5_CHFL_PSWCHECK:
+                return None
+            pswcheck = reader.take(RAR5_PSWCHECK_SIZE)
+            iv = f.read(RAR5_IV_SIZE)
+            return _rar5_line(salt, lg2count, iv, pswcheck) if len(iv) == RAR5_IV_SIZE else None
+        if header_type == RAR5_FILE_HEAD:
+            line = _rar5_file_crypt(reader, extra_start)
+            if line:
+                return line
+        if header_type == RAR5_END_HEAD:
+            return None
+        f.seek(data_size, os.SEEK_CUR)
+
+
+def _rar5_file_crypt(reader: _Reader, extra_start: int) -> Optional[str]:
+    """
+    Ищет запись шифрования в дополнительной области заголовка файла.
+    """
+    reader.pos = extra_start
+    while reader.pos < len(reader.data):
+        record_size = reader.vint()
+        record_end = reader.pos + record_size
+        record_type = reader.vint()
+        if record_type == RAR5_FHEXTRA_CRYPT:
+            reader.vint()
+            crypt_flags = reader.vint()
+            lg2count = reader.take(1)[0]
+            salt = reader.take(RAR5_SALT_SIZE)
+            iv = reader.take(RAR5_IV_SIZE)
+            if not crypt_flags & RAR5_CHFL_PSWCHECK:
+                return None
+            return _rar5_line(salt, lg2count, iv, reader.take(RAR5_PSWCHECK_SIZE))
+        reader.pos = record_end
+    return None
+
+
+def _rar3_hash(f: BinaryIO, archive_name: str) -> Optional[str]:
+    best = None
+    while True:
+        block_start = f.tell()
+        head = f.read(7)
+        if len(head) < 7:
+            break
+        _crc, block_type, flags, head_size = struct.unpack("<HBHH", head)
+        if head_size < 7:
+            raise ValueError("Некорректный размер заголовка RAR3")
+        body = _Reader(f.read(head_size - 7))
+        if block_type == RAR3_MAIN_HEAD and flags & RAR3_MHD_PASSWORD:
+            # Заголовки зашифрованы: за основным заголовком идут соль и зашифрованный блок
+            data = f.read(8 + 16)
+            if len(data) < 24:
+                return None
+            return f"$RAR3$*0*{data[:8].hex()}*{data[8:].hex()}"
+        data_size = 0
+        if block_type == RAR3_FILE_HEAD:
+            pack_size, unp_size, _host_os, file_crc, _ftime, _unp_ver, method, name_size, _attr = \
+                struct.unpack("<IIB4sIBBHI", body.take(25))
+            if flags & RAR3_LHD_LARGE:
+                high_pack, high_unp = struct.unpack("<II", body.take(8))
+                pack_size |= high_pack << 32
+                unp_size |= high_unp << 32
+            body.take(name_size)
+            data_size = pack_size
+            if flags & RAR3_LHD_PASSWORD and flags & RAR3_LHD_SALT and (best is None or pack_size < best["pack_size"]):
+                best = {
+                    "salt": body.take(8), "crc": file_crc, "pack_size": pack_size, "unp_size": unp_size,
+                    "method": method, "offset": block_start + head_size,
+                }
+        elif flags & RAR3_LONG_BLOCK:
+            data_size = struct.unpack("<I", body.take(4))[0]
+        if block_type == RAR3_END_HEAD:
+            break
+        f.seek(block_start + head_size + data_size)
+    if best is None:
+        return None
+    line = f"$RAR3$*1*{best['salt'].hex()}*{best['crc'].hex()}*{best['pack_size']}*{best['unp_size']}*"
+    if best["pack_size"] <= RAR3_INLINE_LIMIT:
+        f.seek(best["offset"])
+        line += f"1*{f.read(best['pack_size']).hex()}"
+    else:
+        line += f"0*{archive_name}*{best['offset']}"
+    return line + f"*{best['method']:02x}"
+
+
+def extract_rar_hash(path: str) -> Optional[str]:
+    """
+    Строка хеша RAR3/RAR5 или None, если архив не зашифрован или это не RAR.
+    ValueError - заголовки повреждены.
+    """
+    with open(path, "rb") as f:
+        signature = f.read(len(RAR5_SIGNATURE))
+        if signature == RAR5_SIGNATURE:
+            return _rar5_hash(f)
+        if signature.startswith(RAR3_SIGNATURE):
+            f.seek(len(RAR3_SIGNATURE))
+            return _rar3_hash(f, os.path.basename(path))
+    return None
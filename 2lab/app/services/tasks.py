@@ -0,0 +1,81 @@
+"""
+Реестр задач подбора пароля.
+
+Идентификаторы выдаются атомарным счётчиком, поэтому параллельные запросы не получают
+одинаковый id. Завершённые задачи хранятся не дольше ttl секунд, а общее число задач
+ограничено maxsize: при переполнении первыми вытесняются самые старые завершённые.
+Все операции - O(1) (вытеснение - амортизированно), память не растёт при постоянной нагрузке.
+Задачи обновляются из потоков пула, поэтому доступ защищён блокировкой.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class RegistryFull(Exception):
+    """
+    В реестре нет места: все задачи ещё выполняются.
+    """
+
+
+class TaskRegistry:
+    def __init__(self, maxsize: int = 1000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._tasks: Dict[int, dict] = {}
+        # Завершённые задачи в порядке завершения: id -> момент завершения
+        self._finished: "OrderedDict[int, float]" = OrderedDict()
+
+    def _evict_expired(self, now: float) -> None:
+        while self._finished:
+            task_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.ttl:
+                break
+            self._finished.popitem(last=False)
+            self._tasks.pop(task_id, None)
+
+    def create(self, **fields) -> int:
+        """
+        Регистрирует новую задачу и возвращает её id.
+        """
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            if len(self._tasks) >= self.maxsize:
+                if not self._finished:
+                    raise RegistryFull()
+                task_id, _ = self._finished.popitem(last=False)
+                self._tasks.pop(task_id, None)
+            task_id = next(self._ids)
+            self._tasks[task_id] = dict(fields)
+            return task_id
+
+    def get(self, task_id: int) -> Optional[dict]:
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def update(self, task_id: int, **fields) -> None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.update(fields)
+
+    def finish(self, task_id: int, **fields) -> None:
+        """
+        Записывает итог задачи; с этого момента отсчитывается её ttl.
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.update(fields)
+                self._finished[task_id] = time.monotonic()
+                self._finished.move_to_end(task_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tasks)
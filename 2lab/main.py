@@ -40,6 +40,15 @@ app = FastAPI(title="Практикум по программированию")
 async def root():
     return {"message": "Hello World"}
 
+@app.on_event("startup")
+async def on_startup():
+    # Соединения с БД открываются один раз на всё время работы приложения
+    await auth.init_db()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await auth.close_db()
+
 app.include_router(auth.router, tags=["Authentication"])
 app.include_router(brut.router, tags=["BrutForce"])
 
@@ -0,0 +1,32 @@
+"""add users token
+
+Revision ID: 5c1f2a9d3e47
+Revises: 1db8c4675675
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f2a9d3e47'
+down_revision: Union[str, None] = '1db8c4675675'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('Users', sa.Column('token', sa.String(), nullable=True))
+    # SQLite не умеет добавлять UNIQUE через ALTER TABLE, поэтому уникальность - индексом
+    op.create_index(op.f('ix_Users_token'), 'Users', ['token'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_Users_token'), table_name='Users')
+    with op.batch_alter_table('Users') as batch_op:
+        batch_op.drop_column('token')
@@ -5,36 +5,57 @@ from fastapi.security import OAuth2PasswordBearer
 import secrets
 import aiosqlite # Используем асинхронную библиотеку для SQLite
 from app.schemas.schemas import User
+from app.services.db_pool import SQLitePool
+from app.services.passwords import hash_password, verify_password
+from app.services.token_cache import TokenCache
 
 DB_PATH = os.path.join('app','db','database.db')
 
+# Схема создаётся один раз при старте приложения, если база не создана миграциями alembic
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        token TEXT UNIQUE
+    );
+"""
+
+# Запросы вынесены в константы: одинаковые строки SQL попадают в кеш
+# подготовленных выражений долгоживущих соединений пула
+SELECT_ID_BY_EMAIL = "SELECT id FROM Users WHERE email = ?"
+INSERT_USER = "INSERT INTO Users (email, password, token) VALUES (?, ?, ?)"
+SELECT_BY_EMAIL = "SELECT id, email, password, token FROM Users WHERE email = ?"
+UPDATE_PASSWORD = "UPDATE Users SET password = ? WHERE id = ?"
+SELECT_BY_TOKEN = "SELECT id, email FROM Users WHERE token = ?"
+
+# Пул соединений открывается при старте приложения (init_db) и живёт до его остановки
+db_pool = SQLitePool(DB_PATH, size=FastApiServerInfo.DB_POOL_SIZE)
+
+# Пользователи по токену: защищённые эндпоинты не ходят в БД на каждый запрос
+token_cache = TokenCache(FastApiServerInfo.TOKEN_CACHE_SIZE, FastApiServerInfo.TOKEN_CACHE_TTL)
+
 router = APIRouter()
 
 # Схема OAuth2 для получения токена из заголовка Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=FastApiServerInfo.LOGIN_ENDPOINT)
 
-# Вспомогательная функция для получения асинхронного соединения с БД
-async def get_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Убедимся, что таблица Users существует (можно вынести в миграции)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS Users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                token TEXT UNIQUE
-            )
-        """)
-        await db.commit()
-        yield db
+async def init_db():
+    await db_pool.open(schema=SCHEMA)
+
+
+async def close_db():
+    await db_pool.close()
+
 
 # Добавление нового пользователя в бд и возврат токена
 @router.post(FastApiServerInfo.SIGN_UP_ENDPOINT)
-async def sign_up(user: User, db: aiosqlite.Connection = Depends(get_db)):
+async def sign_up(user: User):
     # Проверяем, существует ли пользователь с таким email
-    cursor = await db.execute("SELECT id FROM Users WHERE email = ?", (user.email,))
-    existing_user = await cursor.fetchone()
-    await cursor.close()
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(SELECT_ID_BY_EMAIL, (user.email,))
+        existing_user = await cursor.fetchone()
+        await cursor.close()
 
     if existing_user:
         raise HTTPException(
@@ -42,15 +63,26 @@ async def sign_up(user: User, db: aiosqlite.Connection = Depends(get_db)):
             detail="Пользователь с таким email уже существует"
         )
 
+    # Хеш считается в пуле потоков без занятого соединения с БД
+    password_hash = await hash_password(user.password)
+
     # Генерируем токен и вставляем нового пользователя
     token = secrets.token_urlsafe(32) # Генерируем более длинный токен
-    cursor = await db.execute(
-        "INSERT INTO Users (email, password, token) VALUES (?, ?, ?)",
-        (user.email, user.password, token) # В реальном приложении пароль должен быть хеширован!
-    )
-    await db.commit()
-    user_id = cursor.lastrowid # Получаем ID только что вставленной записи
-    await cursor.close()
+    async with db_pool.acquire() as db:
+        try:
+            cursor = await db.execute(INSERT_USER, (user.email, password_hash, token))
+            await db.commit()
+        except aiosqlite.IntegrityError:
+            # Тот же email успели зарегистрировать параллельным запросом
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Пользователь с таким email уже существует"
+            )
+        user_id = cursor.lastrowid # Получаем ID только что вставленной записи
+        await cursor.close()
+    # Новый пользователь сразу попадает в кеш вместо возможных устаревших записей
+    token_cache.invalidate_user(user_id)
+    token_cache.put(token, {"id": user_id, "email": user.email})
 
     return {
         "id": user_id,
@@ -60,24 +92,30 @@ async def sign_up(user: User, db: aiosqlite.Connection = Depends(get_db)):
 
 # Авторизация пользователя и возврат токена
 @router.post(FastApiServerInfo.LOGIN_ENDPOINT)
-async def login(user: User, db: aiosqlite.Connection = Depends(get_db)):
-    # Ищем пользователя по email и паролю
-    # В реальном приложении здесь должна быть проверка хешированного пароля
-    cursor = await db.execute(
-        "SELECT id, email, token FROM Users WHERE email = ? AND password = ?",
-        (user.email, user.password)
-    )
-    user_data = await cursor.fetchone()
-    await cursor.close()
+async def login(user: User):
+    # Ищем пользователя по email, пароль сверяем с хешем
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(SELECT_BY_EMAIL, (user.email,))
+        user_data = await cursor.fetchone()
+        await cursor.close()
 
-    if not user_data:
+    valid, new_hash = await verify_password(user.password, user_data[2] if user_data else None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Некорректный email или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user_id, email, token = user_data
+    user_id, email, _, token = user_data
+    if new_hash:
+        # Пароль хранился открытым текстом или с устаревшим числом раундов
+        async with db_pool.acquire() as db:
+            await db.execute(UPDATE_PASSWORD, (new_hash, user_id))
+            await db.commit()
+    # При повторном входе записи пользователя перечитываются из БД
+    token_cache.invalidate_user(user_id)
+    token_cache.put(token, {"id": user_id, "email": email})
 
     return {
         "id": user_id,
@@ -85,26 +123,44 @@ async def login(user: User, db: aiosqlite.Connection = Depends(get_db)):
         "token": token
     }
 
-# Вывод информации об авторизованном пользователе по токену
-@router.post(FastApiServerInfo.USER_INFO_ENDPOINT)
-async def get_user_info(token: str = Depends(oauth2_scheme), db: aiosqlite.Connection = Depends(get_db)):
-    # Ищем пользователя по токену
+# Поиск пользователя по токену
+async def find_user_by_token(db: aiosqlite.Connection, token: str):
     cursor = await db.execute(
-        "SELECT id, email FROM Users WHERE token = ?",
+        SELECT_BY_TOKEN,
         (token,)
     )
     user_data = await cursor.fetchone()
     await cursor.close()
-
     if not user_data:
+        return None
+    user_id, email = user_data
+    return {
+        "id": user_id,
+        "email": email
+    }
+
+# Пользователь по токену: сначала из кеша, при промахе - из БД
+async def resolve_token(token: str):
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    async with db_pool.acquire() as db:
+        user = await find_user_by_token(db, token)
+    if user is not None:
+        token_cache.put(token, user)
+    return user
+
+# Вывод информации об авторизованном пользователе по токену
+@router.post(FastApiServerInfo.USER_INFO_ENDPOINT)
+async def get_user_info(token: str = Depends(oauth2_scheme)):
+    # Ищем пользователя по токену
+    user = await resolve_token(token)
+
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Недействительный токен",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user_id, email = user_data
-    return {
-        "id": user_id,
-        "email": email
-    }
\ No newline at end of file
+    return user
\ No newline at end of file
@@ -1,46 +1,189 @@
-import base64
-import os
+import asyncio
+import json
+from uuid import uuid4
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+import redis.asyncio as aioredis
+from celery.result import AsyncResult
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
-from app.celery.tasks import brute_force_rar_task, long_running_parse
+from app.api.auth import get_user_info
+from app.celery.celery_app import celery_app
+from app.celery.tasks import dispatch_brute_force, job_key, long_running_parse, release_user_slot
 from app.core.endpoints import FastApiServerInfo
+from app.services import crack_cache, estimator, scheduler
+from app.services.blob_store import purge_expired_blobs, save_upload
+from app.services.channels import task_channel, user_channel
+from app.services.candidates import MODES, bruteforce_spec, is_exhaustive, make_space
+from app.services.markov import resolve_charset
 
 router = APIRouter()
 
+redis_client = aioredis.Redis(host=FastApiServerInfo.REDIS_HOST, port=FastApiServerInfo.REDIS_PORT, db=FastApiServerInfo.REDIS_DB, decode_responses=True)
+
 # Вспомогательные функции (extract_rar_hash, generate_passwords, brute_force_rar)
 # теперь являются частью Celery задачи или вызываются ей.
 # Локальное управление задачами (tasks = {}) и TEMP_DIR больше не нужны здесь.
 
 
+async def dispatch_or_release(job):
+    """
+    Отправляет допущенную задачу в брокер. Если отправка не удалась, задача помечается
+    ошибкой и её слот освобождается, иначе квота пользователя занята до истечения ключей;
+    задача из очереди пользователя, получившая слот, отправляется так же.
+    """
+    try:
+        # Отправка chord-а в брокер - блокирующие вызовы kombu, их нельзя делать в цикле событий
+        await asyncio.to_thread(dispatch_brute_force, job)
+    except Exception as e:
+        await redis_client.hset(job_key(job["job_id"], "meta"), "state", "error")
+        await redis_client.publish(task_channel(job["job_id"]), json.dumps({
+            "task_id": job["job_id"], "status": "error", "detail": f"Не удалось запустить задачу: {e}"
+        }))
+        next_job = await release_user_slot(redis_client, job["user_id"])
+        if next_job:
+            try:
+                await dispatch_or_release(next_job)
+            except Exception as next_error:
+                print(f"Не удалось запустить задачу {next_job['job_id']} из очереди: {next_error}")
+        raise
+
+
 @router.post(FastApiServerInfo.BRUT_HASH)
 async def brut_file(
     file: UploadFile = File(...),
-    charset: str = Form(...),
-    max_length: int = Form(...)
+    charset: str = Form(None),
+    max_length: int = Form(None),
+    shards: int = Form(FastApiServerInfo.BRUT_SHARDS),
+    workers: int = Form(FastApiServerInfo.BRUT_POOL_WORKERS),
+    mode: str = Form("bruteforce"),
+    wordlist: str = Form(FastApiServerInfo.DEFAULT_WORDLIST),
+    rules: str = Form(FastApiServerInfo.DEFAULT_RULES),
+    mask: str = Form(None),
+    custom_charsets: str = Form(None),
+    increment: bool = Form(False),
+    increment_min: int = Form(None),
+    increment_max: int = Form(None),
+    threshold: int = Form(None),
+    user: dict = Depends(get_user_info)
 ):
-    if max_length > 8:
-        raise HTTPException(status_code=400, detail="max_length не может превышать 8")
+    # Режим перебора: полный перебор charset до max_length, словарь с правилами мутации
+    # маска (custom_charsets - JSON-список пользовательских наборов ?1..?4, increment -
+    # все префиксы маски длиной от increment_min до increment_max) или
+    # марковский порядок (charset - символы или имя *.chr, threshold - символов на позицию)
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Неизвестный режим {mode}, допустимые: {', '.join(MODES)}")
+    if mode == "wordlist":
+        space = {"mode": "wordlist", "wordlist": wordlist, "rules": [name.strip() for name in rules.split(",") if name.strip()]}
+    elif mode == "mask":
+        try:
+            charsets = json.loads(custom_charsets) if custom_charsets else []
+        except ValueError:
+            raise HTTPException(status_code=400, detail="custom_charsets должен быть JSON-списком строк")
+        if not isinstance(charsets, list) or not all(isinstance(charset, str) for charset in charsets):
+            raise HTTPException(status_code=400, detail="custom_charsets должен быть JSON-списком строк")
+        space = {
+            "mode": "mask", "mask": mask, "charsets": charsets,
+            "increment": increment, "increment_min": increment_min, "increment_max": increment_max,
+        }
+    elif mode == "markov":
+        charset = resolve_charset(charset)
+        space = {"mode": "markov", "charset": charset, "max_length": max_length, "threshold": threshold}
+    else:
+        space = bruteforce_spec(charset, max_length)
+    try:
+        # Словарь и правила читаются с диска один раз и кешируются, но не в цикле событий
+        total_passwords = (await asyncio.to_thread(make_space, space)).size
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if total_passwords == 0:
+        raise HTTPException(status_code=400, detail="Пустое пространство паролей: пустой charset, max_length < 1 или пустой словарь")
+    if shards < 1 or workers < 1:
+        raise HTTPException(status_code=400, detail="shards и workers должны быть не меньше 1")
+    if shards > FastApiServerInfo.MAX_BRUT_SHARDS:
+        raise HTTPException(status_code=400, detail=f"shards должно быть не больше {FastApiServerInfo.MAX_BRUT_SHARDS}")
+    if workers > 1 and not FastApiServerInfo.BRUT_POOL_ENABLED:
+        raise HTTPException(status_code=400, detail="Пул процессов внутри задачи не настроен: workers должно быть 1")
+    if workers > FastApiServerInfo.MAX_BRUT_POOL_WORKERS:
+        raise HTTPException(status_code=400, detail=f"workers должно быть не больше {FastApiServerInfo.MAX_BRUT_POOL_WORKERS}")
     
     try:
-        content = await file.read()
+        # Архив потоково сохраняется в общее хранилище, в Celery передаётся только его id
+        blob_id = await save_upload(file)
         await file.close()
+        await asyncio.to_thread(purge_expired_blobs)
+
+        # Этот архив уже обрабатывали: отвечаем из кеша без запуска перебора
+        hash_value, cached_password, exhausted = await crack_cache.lookup_archive(redis_client, blob_id)
+        if cached_password:
+            return {
+                "message": "Пароль найден в кеше.",
+                "task_id": None,
+                "status": "completed",
+                "result": cached_password,
+                "hash": hash_value
+            }
+        if hash_value and is_exhaustive(space) and crack_cache.is_covered(exhausted, charset, max_length):
+            return {
+                "message": "Это пространство паролей уже перебрано, пароль не найден.",
+                "task_id": None,
+                "status": "failed",
+                "result": None,
+                "hash": hash_value
+            }
+
+        # Оцениваем длительность по измеренной скорости воркеров: слишком дорогие задачи
+        # отклоняются, длинные уходят в очередь длинных задач
+        # Одновременно выполняется не больше шардов, чем слотов у воркеров Celery;
+        # процессы пула ускоряют шард, только если воркеры с --pool solo настроены
+        pool_size = workers if FastApiServerInfo.BRUT_POOL_ENABLED else 1
+        parallelism = min(shards, total_passwords, FastApiServerInfo.CELERY_WORKER_SLOTS) * pool_size
+        estimate = await estimator.estimate(redis_client, hash_value, total_passwords, parallelism)
+        if estimate["seconds"] > FastApiServerInfo.MAX_JOB_SECONDS:
+            raise HTTPException(
+                status_code=400,
+                detail={"message": "Задача превышает допустимый бюджет времени", "estimate": estimate}
+            )
+        queue = scheduler.queue_for(estimate["seconds"])
+
+        # Задача запускается сразу, если у пользователя есть свободный слот,
+        # иначе ждёт в его личной очереди (см. app/services/scheduler.py)
+        job_id = str(uuid4())
+        job = {
+            "job_id": job_id,
+            "blob_id": blob_id,
+            "original_filename": file.filename,
+            "charset": charset,
+            "max_length": max_length,
+            "space": space,
+            "shards": min(shards, total_passwords),
+            "workers": workers,
+            "user_id": user["id"],
+            "queue": queue
+        }
+        admitted = await scheduler.admit(redis_client, user["id"], json.dumps(job))
+        await redis_client.hset(job_key(job_id, "meta"), mapping={
+            "shards": job["shards"], "total": total_passwords, "user_id": user["id"],
+            "state": "running" if admitted else "queued"
+        })
+        await redis_client.expire(job_key(job_id, "meta"), FastApiServerInfo.JOB_RECOVERY_TTL)
+        # Уведомления задачи получат все соединения пользователя на любой реплике API:
+        # реплики, где он подключён, по этому сообщению подписываются на канал задачи
+        await redis_client.publish(user_channel(user["id"]), json.dumps({
+            "task_id": job_id, "user_id": user["id"], "status": "started" if admitted else "queued",
+            "detail": "Задача запущена" if admitted else "Задача ждёт в очереди пользователя"
+        }))
+        if admitted:
+            await dispatch_or_release(job)
 
-        # Кодируем содержимое файла в base64 для безопасной передачи через Celery (JSON-сериализуемый формат)
-        content_b64 = base64.b64encode(content).decode('utf-8')
-
-        # Отправляем задачу в Celery
-        task = brute_force_rar_task.delay(
-            file_content_b64=content_b64,
-            original_filename=file.filename,
-            charset=charset,
-            max_length=max_length
-        )
-        
         return {
-            "message": "Задача по подбору пароля запущена.",
-            "task_id": task.id
+            "message": "Задача по подбору пароля запущена." if admitted else "Задача поставлена в очередь пользователя.",
+            "task_id": job_id,
+            "status": "started" if admitted else "queued",
+            "queue": queue,
+            "estimate": estimate
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Ошибка в эндпоинте brut_file: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка запуска задачи: {str(e)}")
@@ -49,4 +192,52 @@ async def brut_file(
 @router.post(FastApiServerInfo.LONG)
 async def run_parse():
     task = long_running_parse.delay()
-    return {"task_id": task.id}
\ No newline at end of file
+    return {"task_id": task.id}
+
+
+@router.get(FastApiServerInfo.GET_STATUS + "{task_id}")
+async def get_status(task_id: str):
+    """
+    Состояние задачи из хранилища результатов Celery и текущий прогресс перебора из Redis.
+    """
+    result = AsyncResult(task_id, app=celery_app)
+    response = {"task_id": task_id, "state": result.state, "status": result.state.lower(), "result": None}
+    if result.ready():
+        if isinstance(result.result, dict):
+            response["status"] = result.result.get("status", response["status"])
+            response["result"] = result.result.get("result")
+            response["detail"] = result.result.get("detail")
+        elif result.failed():
+            response["status"] = "error"
+            response["detail"] = str(result.result)
+        return response
+
+    meta = await redis_client.hgetall(job_key(task_id, "meta"))
+    if meta:
+        processed = int(await redis_client.get(job_key(task_id, "processed")) or 0)
+        total = int(meta.get("total") or 0)
+        response["status"] = "cancelling" if await redis_client.exists(job_key(task_id, "cancelled")) else meta.get("state", "running")
+        response["processed"] = processed
+        response["total"] = total
+        response["progress"] = int(processed / total * 100) if total else 0
+    return response
+
+
+@router.delete(FastApiServerInfo.TASKS + "{task_id}")
+async def cancel_task(task_id: str, user: dict = Depends(get_user_info)):
+    """
+    Отменяет задачу перебора пользователя. Шарды останавливаются сами, заметив флаг отмены
+    при ближайшей публикации прогресса; задача из очереди пользователя завершится сразу
+    после запуска. Callback chord-а не отзывается: он публикует итог и освобождает слот.
+    """
+    result = AsyncResult(task_id, app=celery_app)
+    if result.ready():
+        raise HTTPException(status_code=409, detail="Задача уже завершена")
+
+    meta = await redis_client.hgetall(job_key(task_id, "meta"))
+    if not meta:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if str(meta.get("user_id")) != str(user["id"]):
+        raise HTTPException(status_code=403, detail="Задача принадлежит другому пользователю")
+    await redis_client.set(job_key(task_id, "cancelled"), 1, ex=FastApiServerInfo.JOB_RECOVERY_TTL)
+    return {"task_id": task_id, "status": "cancelling"}
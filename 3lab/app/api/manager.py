@@ -1,31 +1,193 @@
+import asyncio
 import json
-from typing import List
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
 from fastapi.websockets import WebSocket
 
+from app.core.endpoints import FastApiServerInfo
+from app.services.channels import task_channel, user_channel
+
+# Статусы, после которых сообщений по задаче больше не будет
+FINAL_STATUSES = ("done", "completed", "failed", "cancelled", "error")
+
+
+class Subscriber:
+    """
+    Одно веб-сокет соединение: его подписки и собственный ограниченный буфер отправки.
+    Сообщения отправляет отдельная задача, поэтому медленный клиент не задерживает рассылку.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.user_id: Optional[int] = None
+        self.task_ids: Set[str] = set()
+        self.queue_size = queue_size
+        # Элементы буфера: (сериализованное сообщение, это промежуточный прогресс)
+        self.buffer: Deque[Tuple[str, bool]] = deque()
+        self.ready = asyncio.Event()
+        self.sender: Optional[asyncio.Task] = None
+
+    def wants(self, message: dict, owner: Optional[int]) -> bool:
+        task_id = message.get("task_id")
+        if task_id is None:
+            # Служебные сообщения без задачи получают все
+            return True
+        return task_id in self.task_ids or (owner is not None and owner == self.user_id)
+
+    def offer(self, serialized_message: str, is_progress: bool) -> None:
+        """
+        Кладёт сообщение в буфер без ожидания. При переполнении первым выбрасывается
+        самый старый промежуточный прогресс; итоговые сообщения ради прогресса не вытесняются.
+        """
+        if len(self.buffer) >= self.queue_size:
+            oldest_progress = next((item for item in self.buffer if item[1]), None)
+            if oldest_progress is not None:
+                self.buffer.remove(oldest_progress)
+            elif is_progress:
+                return
+            else:
+                self.buffer.popleft()
+        self.buffer.append((serialized_message, is_progress))
+        self.ready.set()
+
+    async def run_sender(self) -> None:
+        while True:
+            while not self.buffer:
+                self.ready.clear()
+                await self.ready.wait()
+            serialized_message, _ = self.buffer.popleft()
+            await self.websocket.send_text(serialized_message)
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Храним список активных веб-сокет соединений
-        self._active_connections: List[WebSocket] = []
+    """
+    Соединения одной реплики API. Реплика знает только свои веб-сокеты:
+    по ним вычисляется набор каналов Redis, на которые ей нужно быть подписанной (channels),
+    а при его изменении вызывается on_channels_changed.
+    """
+
+    def __init__(self, queue_size: int = FastApiServerInfo.WS_QUEUE_SIZE):
+        # Активные веб-сокет соединения и их подписки
+        self._subscribers: Dict[WebSocket, Subscriber] = {}
+        # Владелец задачи: сообщения задачи получают все соединения этого пользователя.
+        # Заполняется по сообщениям из канала пользователя, поэтому задача, запущенная
+        # через другую реплику, тоже известна
+        self._task_owners: Dict[str, int] = {}
+        self._queue_size = queue_size
+        self.on_channels_changed: Optional[Callable[[], None]] = None
+
+    def channels(self) -> Set[str]:
+        """
+        Каналы задач и пользователей, сообщения которых ждут соединения этой реплики.
+        """
+        task_ids: Set[str] = set()
+        user_ids: Set[int] = set()
+        for subscriber in self._subscribers.values():
+            task_ids |= subscriber.task_ids
+            if subscriber.user_id is not None:
+                user_ids.add(subscriber.user_id)
+        task_ids |= {task_id for task_id, owner in self._task_owners.items() if owner in user_ids}
+        return {task_channel(task_id) for task_id in task_ids} | {user_channel(user_id) for user_id in user_ids}
+
+    def _channels_changed(self) -> None:
+        if self.on_channels_changed:
+            self.on_channels_changed()
 
     async def connect(self, websocket: WebSocket) -> None:
         """
-        Принимает входящее соединение и добавляет его в список активных.
+        Принимает входящее соединение и запускает для него отправку сообщений.
         """
         await websocket.accept()
-        self._active_connections.append(websocket)
+        subscriber = Subscriber(websocket, self._queue_size)
+        subscriber.sender = asyncio.create_task(self._send_loop(subscriber))
+        self._subscribers[websocket] = subscriber
 
     def disconnect(self, websocket: WebSocket) -> None:
         """
         Удаляет соединение из списка активных.
         """
-        if websocket in self._active_connections:
-            self._active_connections.remove(websocket)
+        subscriber = self._subscribers.pop(websocket, None)
+        if subscriber and subscriber.sender:
+            subscriber.sender.cancel()
+        if subscriber:
+            self._channels_changed()
+
+    async def _send_loop(self, subscriber: Subscriber) -> None:
+        try:
+            await subscriber.run_sender()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Соединение закрыто или сломано - больше ему ничего не отправляем
+            self.disconnect(subscriber.websocket)
+
+    def set_user(self, websocket: WebSocket, user_id: int) -> None:
+        if websocket in self._subscribers:
+            self._subscribers[websocket].user_id = user_id
+            self._channels_changed()
+
+    def subscribe(self, websocket: WebSocket, task_id: str) -> None:
+        if websocket in self._subscribers:
+            self._subscribers[websocket].task_ids.add(task_id)
+            self._channels_changed()
+
+    def unsubscribe(self, websocket: WebSocket, task_id: str) -> None:
+        if websocket in self._subscribers:
+            self._subscribers[websocket].task_ids.discard(task_id)
+            self._channels_changed()
+
+    def assign_task(self, task_id: str, user_id: int) -> None:
+        if self._task_owners.get(task_id) != user_id:
+            self._task_owners[task_id] = user_id
+            self._channels_changed()
+
+    async def handle_command(self, websocket: WebSocket, text: str, resolve_token=None, resolve_owner=None) -> None:
+        """
+        Обрабатывает команду клиента:
+        {"action": "subscribe" | "unsubscribe", "task_id": ...} или {"action": "auth", "token": ...}.
+        Подписаться можно только на свою задачу: resolve_owner(task_id) возвращает id её владельца.
+        """
+        try:
+            command = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(command, dict):
+            return
+        action = command.get("action")
+        if action == "subscribe" and command.get("task_id") and resolve_owner:
+            subscriber = self._subscribers.get(websocket)
+            if subscriber is None or subscriber.user_id is None:
+                return
+            if await resolve_owner(command["task_id"]) == subscriber.user_id:
+                self.subscribe(websocket, command["task_id"])
+        elif action == "unsubscribe" and command.get("task_id"):
+            self.unsubscribe(websocket, command["task_id"])
+        elif action == "auth" and command.get("token") and resolve_token:
+            user = await resolve_token(command["token"])
+            if user:
+                self.set_user(websocket, user["id"])
 
     async def broadcast(self, message: dict) -> None:
         """
-        Отправляет сообщение всем активным клиентам.
+        Отправляет сообщение только подписанным на него клиентам.
+        Сообщение сериализуется один раз и ставится в очереди соединений без ожидания отправки.
+        Сообщение с user_id (из канала пользователя) назначает владельца задачи.
         """
         serialized_message = json.dumps(message)
-        for connection in self._active_connections:
-            await connection.send_text(serialized_message)
\ No newline at end of file
+        task_id = message.get("task_id")
+        if task_id is not None and message.get("user_id") is not None:
+            self.assign_task(task_id, message["user_id"])
+        owner = self._task_owners.get(task_id)
+        is_progress = message.get("status") == "progress"
+        for subscriber in list(self._subscribers.values()):
+            if subscriber.wants(message, owner):
+                subscriber.offer(serialized_message, is_progress)
+        if task_id is not None and message.get("status") in FINAL_STATUSES:
+            # Сообщений по задаче больше не будет - отписываемся от её канала
+            self._task_owners.pop(task_id, None)
+            for subscriber in self._subscribers.values():
+                subscriber.task_ids.discard(task_id)
+            self._channels_changed()
+
+
+manager = ConnectionManager()
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.core.endpoints import FastApiServerInfo
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationConsumer:
+    """
+    Читает канал Redis и передаёт уведомления обработчику (ConnectionManager.broadcast).
+
+    Чтение и рассылка разделены ограниченным буфером: читатель не ждёт рассылку,
+    при переполнении первыми выбрасываются самые старые сообщения о прогрессе.
+    При обрыве соединения с Redis подписка восстанавливается с экспоненциальной задержкой.
+
+    Кроме общего канала channel, потребитель подписан на каналы, которые возвращает channels
+    (ConnectionManager.channels). Набор меняется на лету через одно и то же соединение
+    подписки после вызова channels_changed, так что на каждую реплику API приходится
+    одна подписка и только нужные ей сообщения.
+    """
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        channel: str,
+        handler: Callable[[dict], Awaitable[None]],
+        buffer_size: int = FastApiServerInfo.NOTIFY_BUFFER_SIZE,
+        channels: Optional[Callable[[], Set[str]]] = None,
+    ):
+        self.redis_client = redis_client
+        self.channel = channel
+        self.channels = channels
+        # Текущее соединение подписки и каналы, на которые оно подписано
+        self._pubsub = None
+        self._subscribed: Set[str] = set()
+        self._channels_dirty = asyncio.Event()
+        self.handler = handler
+        self.buffer_size = buffer_size
+        # Элементы буфера: (сообщение, время получения)
+        self._buffer: Deque[Tuple[dict, float]] = deque()
+        self._ready = asyncio.Event()
+        self._tasks = []
+        self.metrics: Dict[str, float] = {
+            "received": 0,
+            "delivered": 0,
+            "dropped": 0,
+            "reconnects": 0,
+            "buffered": 0,
+            "channels": 0,
+            # Задержка от публикации воркером до рассылки, секунды (для сообщений с меткой ts)
+            "lag_last": 0.0,
+            "lag_max": 0.0,
+        }
+
+    async def messages(self):
+        """
+        Асинхронный итератор по сообщениям канала, переживающий переподключения к Redis.
+        """
+        backoff = FastApiServerInfo.NOTIFY_RECONNECT_MIN
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                wanted = self._wanted()
+                await pubsub.subscribe(*wanted)
+                self._pubsub, self._subscribed = pubsub, wanted
+                # Набор каналов мог измениться, пока шла подписка
+                self._channels_dirty.set()
+                backoff = FastApiServerInfo.NOTIFY_RECONNECT_MIN
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message" and message.get("data"):
+                        yield message["data"]
+            except (ConnectionError, TimeoutError, OSError) as e:
+                self.metrics["reconnects"] += 1
+                logger.warning(f"Подписка на {self.channel} потеряна: {e}. Повтор через {backoff} с")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, FastApiServerInfo.NOTIFY_RECONNECT_MAX)
+            except Exception as e:
+                # Любая другая ошибка подписки тоже не должна останавливать уведомления реплики
+                self.metrics["reconnects"] += 1
+                logger.error(f"Ошибка подписки на {self.channel}: {e!r}. Повтор через {backoff} с", exc_info=True)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, FastApiServerInfo.NOTIFY_RECONNECT_MAX)
+            finally:
+                self._pubsub, self._subscribed = None, set()
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+    def _wanted(self) -> Set[str]:
+        return {self.channel} | (self.channels() if self.channels else set())
+
+    def channels_changed(self) -> None:
+        """
+        Сообщает, что набор нужных каналов изменился. Вызывается синхронно из ConnectionManager.
+        """
+        self._channels_dirty.set()
+
+    async def _sync_channels(self) -> None:
+        """
+        Приводит подписку к актуальному набору каналов. Изменения применяются
+        одной задачей по очереди, поэтому порядок подписок и отписок не нарушается.
+        """
+        while True:
+            await self._channels_dirty.wait()
+            self._channels_dirty.clear()
+            pubsub = self._pubsub
+            if pubsub is None:
+                # Подписки нет: при переподключении будет взят актуальный набор
+                continue
+            wanted = self._wanted()
+            added, removed = wanted - self._subscribed, self._subscribed - wanted
+            try:
+                if added:
+                    await pubsub.subscribe(*added)
+                if removed:
+                    await pubsub.unsubscribe(*removed)
+                self._subscribed = wanted
+            except Exception as e:
+                # Читатель переподключится и подпишется на актуальный набор сам
+                logger.warning(f"Не удалось обновить подписки: {e!r}")
+
+    def _offer(self, message: dict) -> None:
+        if len(self._buffer) >= self.buffer_size:
+            oldest_progress = next((item for item in self._buffer if item[0].get("status") == "progress"), None)
+            if oldest_progress is not None:
+                self._buffer.remove(oldest_progress)
+            elif message.get("status") == "progress":
+                self.metrics["dropped"] += 1
+                return
+            else:
+                self._buffer.popleft()
+            self.metrics["dropped"] += 1
+        self._buffer.append((message, time.time()))
+        self._ready.set()
+
+    async def _reader(self) -> None:
+        async for data in self.messages():
+            self.metrics["received"] += 1
+            # Ошибка в одном сообщении не должна останавливать чтение канала
+            try:
+                message = json.loads(data)
+                if isinstance(message, dict):
+                    self._offer(message)
+                else:
+                    logger.warning(f"Некорректное уведомление: {data!r}")
+            except Exception as e:
+                logger.warning(f"Некорректное уведомление {data!r}: {e!r}")
+
+    async def _dispatcher(self) -> None:
+        while True:
+            while not self._buffer:
+                self._ready.clear()
+                await self._ready.wait()
+            message, _ = self._buffer.popleft()
+            try:
+                await self.handler(message)
+                self.metrics["delivered"] += 1
+            except Exception as e:
+                logger.error(f"Ошибка рассылки уведомления: {e}", exc_info=True)
+            published_at = message.get("ts")
+            if isinstance(published_at, (int, float)):
+                lag = max(time.time() - published_at, 0.0)
+                self.metrics["lag_last"] = lag
+                self.metrics["lag_max"] = max(self.metrics["lag_max"], lag)
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._reader()),
+            asyncio.create_task(self._dispatcher()),
+            asyncio.create_task(self._sync_channels()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, float]:
+        self.metrics["buffered"] = len(self._buffer)
+        self.metrics["channels"] = len(self._subscribed)
+        return dict(self.metrics)
@@ -15,6 +15,20 @@ celery_app.conf.update(
     result_serializer="json",
     accept_content=["json"],
     result_expires=3600,
+    # Задача подтверждается только после завершения: при падении воркера
+    # сообщение вернётся в очередь, и перебор продолжится с контрольной точки
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    broker_transport_options={"visibility_timeout": FastApiServerInfo.BROKER_VISIBILITY_TIMEOUT},
+    # Короткие и длинные задачи в разных очередях, чтобы небольшие задачи не ждали длинных.
+    # Шарды перебора направляются в очередь явно при запуске (см. dispatch_brute_force).
+    task_default_queue=FastApiServerInfo.SHORT_QUEUE,
+    task_routes={
+        "app.celery.tasks.long_running_parse": {"queue": FastApiServerInfo.SHORT_QUEUE},
+        "app.celery.tasks.merge_brute_force_shards": {"queue": FastApiServerInfo.SHORT_QUEUE},
+    },
+    # Воркер не забирает задачи впрок, иначе длинная задача задержит уже взятые короткие
+    worker_prefetch_multiplier=1,
 )
 
 # Передаю все "тяжелые" процессы которые выполняются на celery + redis
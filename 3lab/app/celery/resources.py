@@ -0,0 +1,64 @@
+"""
+Ресурсы, общие для всех задач одного процесса воркера Celery.
+
+Цикл событий и пул соединений с Redis создаются один раз при старте процесса
+(сигнал worker_process_init) и переиспользуются всеми задачами, вместо того чтобы
+каждая задача создавала новый цикл и новое подключение.
+"""
+import asyncio
+import logging
+
+import redis.asyncio as aioredis
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.endpoints import FastApiServerInfo
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_redis_pool = None
+
+
+@worker_process_init.connect
+def init_worker_resources(**kwargs):
+    global _loop, _redis_pool
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _redis_pool = aioredis.ConnectionPool(
+        host=FastApiServerInfo.REDIS_HOST,
+        port=FastApiServerInfo.REDIS_PORT,
+        db=FastApiServerInfo.REDIS_DB,
+        max_connections=FastApiServerInfo.REDIS_POOL_SIZE,
+    )
+    logger.info("Ресурсы процесса воркера созданы")
+
+
+@worker_process_shutdown.connect
+def close_worker_resources(**kwargs):
+    global _loop, _redis_pool
+    if _loop is None:
+        return
+    if _redis_pool is not None:
+        _loop.run_until_complete(_redis_pool.disconnect())
+    _loop.close()
+    _loop, _redis_pool = None, None
+
+
+def get_loop():
+    """
+    Цикл событий процесса. Создаётся при первом обращении, если воркер
+    запущен без prefork (например, --pool=solo) и сигнал не пришёл.
+    """
+    if _loop is None:
+        init_worker_resources()
+    return _loop
+
+
+def get_redis():
+    """
+    Клиент Redis поверх общего пула соединений процесса.
+    """
+    if _redis_pool is None:
+        init_worker_resources()
+    return aioredis.Redis(connection_pool=_redis_pool)
+
@@ -1,18 +1,24 @@
 import asyncio
-import base64
-import itertools
 import json
 import logging # Добавлено для логирования
 import os
 import rarfile
 import shutil
-import subprocess
+import time
 import uuid
 
-import redis.asyncio as aioredis
+from celery import chord
 
 from app.celery.celery_app import celery_app
+from app.celery.resources import get_loop, get_redis
 from app.core.endpoints import FastApiServerInfo
+from app.services import crack_cache, estimator, extractors, scheduler
+from app.services.blob_store import blob_path, touch_blob
+from app.services.candidates import bruteforce_spec, is_exhaustive, make_space
+from app.services.channels import task_channel
+from app.services.keyspace import split_keyspace
+from app.services.progress import ProgressReporter
+from app.services.verify_pool import brute_force_pool, chunk_size_for, make_checker, pool_available
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
@@ -26,219 +32,414 @@ os.chmod(TEMP_DIR_CELERY, 0o777)  # Дать полный доступ к фай
 rarfile.UNRAR_TOOL = FastApiServerInfo.UNRAR_TOOL
 
 
-def extract_rar_hash_celery(archive_path):
+def job_key(task_id, name):
     """
-    Извлекает хеш RAR-архива с помощью утилиты rar2john.
+    Ключ Redis с общим состоянием задачи, разделённой на шарды.
     """
-    try:
-        process = subprocess.run(
-            [FastApiServerInfo.RAR2JOHN_PATH, archive_path],
-            capture_output=True,
-            text=True,
-            check=False  # Проверяем код возврата вручную для логирования stderr
-        )
-
-        if process.returncode != 0:
-            logger.error(
-                f"rar2john завершился с ошибкой для {archive_path}, код: {process.returncode}. "
-                f"Stderr: {process.stderr.strip()}. Stdout: {process.stdout.strip()}"
-            )
-            return None
-
-        lines = process.stdout.strip().splitlines()
-        if not lines:
-            logger.error(f"rar2john не вернул вывод для {archive_path}. Stderr: {process.stderr.strip()}")
-            return None
-
-        hash_value = None
-        # Ищем строку, похожую на хеш
-        for line in lines:
-            # $RAR3$ и $RAR5$ - распространенные идентификаторы хешей RAR
-            if "$RAR3$" in line or "$RAR5$" in line:
-                hash_value = line.strip()
-                break
-        
-        if not hash_value and lines: # Если специфический паттерн не найден, берем первую строку
-            hash_value = lines[0].strip()
-            logger.warning(f"Не найден типичный паттерн хеша RAR в выводе rar2john для {archive_path}. Используется первая строка: '{hash_value}'. Полный вывод: {process.stdout.strip()}")
+    return f"brut:{task_id}:{name}"
 
-        if not hash_value:
-            logger.error(f"Вывод rar2john для {archive_path} не содержит распознаваемого хеша. Вывод: {process.stdout.strip()}. Stderr: {process.stderr.strip()}")
-            return None
 
-        return hash_value
-    except FileNotFoundError:
-        logger.error(f"Ошибка: rar2john не найден по пути {FastApiServerInfo.RAR2JOHN_PATH}")
-        return None
-    except Exception as e:
-        logger.error(f"Ошибка извлечения хеша из архива {archive_path}: {e}", exc_info=True)
-        return None
+def job_keys(task_id):
+    """
+    Все ключи общего состояния задачи - удаляются после её завершения.
+    """
+    return [job_key(task_id, name) for name in ("found", "processed", "checkpoint", "cancelled", "meta")]
 
 
-def generate_passwords_celery(charset, max_length, output_file):
+def stop_keys(task_id):
     """
-    Генерирует все возможные комбинации символов и записывает их в файл.
-    Возвращает общее количество сгенерированных паролей.
+    Флаги, при любом из которых шард прекращает перебор: пароль найден или задача отменена.
     """
-    count = 0
-    with open(output_file, "w", encoding="utf-8") as f:
-        for length in range(1, max_length + 1):
-            for pwd_tuple in itertools.product(charset, repeat=length):
-                password = ''.join(pwd_tuple)
-                f.write(password + "\n")
-                count += 1
-    logger.info(f"Сгенерировано {count} паролей, записано в файл {output_file}")
-    return count
+    return [job_key(task_id, "found"), job_key(task_id, "cancelled")]
+
+
+def extract_hash_celery(archive_path, original_filename=None):
+    """
+    Определяет тип файла по сигнатуре и извлекает его хеш подходящим извлекателем
+    (app/services/extractors.py). Возвращает строку хеша или None.
+    """
+    try:
+        record = extractors.extract_hash(archive_path, original_filename)
+    except Exception as e:
+        logger.error(f"Ошибка извлечения хеша из файла {archive_path}: {e}", exc_info=True)
+        return None
+    if record is None:
+        return None
+    logger.info(f"Хеш формата {record['format']} извлечён из {original_filename or archive_path} ({record['extractor']})")
+    return record["hash"]
 
 
-async def brute_force_rar_celery(task_id, archive_path, passwords_file, total_passwords, redis_client, temp_task_dir_for_extraction):
+async def brute_force_rar_celery(task_id, archive_path, space, total_passwords, redis_client, temp_task_dir_for_extraction, start=0, stop=None, workers=1, hash_value=None, exhausted=(), checkpoint_field=None, keepalive=None):
     """
-    Перебирает пароли из файла, пытаясь открыть архив. Отправляет прогресс через Redis.
+    Перебирает пароли из диапазона [start, stop) ленивого пространства кандидатов space
+    (описание режима перебора, см. app/services/candidates.py),
+    проверяя их по хешу RAR5 или пробной распаковкой архива. Отправляет общий для всех шардов прогресс через Redis
+    и прекращает перебор, как только пароль найден другим шардом или задача отменена.
+    При workers > 1 пароли проверяются в пуле процессов.
+    Пароли из уже перебранных ранее пространств exhausted не проверяются повторно.
+    Индекс проверенных паролей периодически сохраняется как контрольная точка шарда checkpoint_field.
     """
     extraction_target_dir = os.path.join(temp_task_dir_for_extraction, "extract_test_area")
     os.makedirs(extraction_target_dir, exist_ok=True)
+    stop = total_passwords if stop is None else min(stop, total_passwords)
 
     try:
-        rf = rarfile.RarFile(archive_path)
+        checker = make_checker(archive_path, extraction_target_dir, hash_value)
     except Exception as e:
-        await redis_client.publish("notifications", json.dumps({
-            "task_id": task_id, "status": "error", "detail": f"Ошибка открытия архива: {e}"
+        # Не итоговый статус: итог (failed) опубликует вызывающая задача
+        await redis_client.publish(task_channel(task_id), json.dumps({
+            "task_id": task_id, "status": "archive_error", "detail": f"Ошибка открытия архива: {e}"
         }))
         return None
 
-    processed_count = 0
-    with open(passwords_file, "r", encoding="utf-8") as f:
-        for line in f:
-            password = line.strip()
-            processed_count += 1
-            try:
-                rf.extractall(path=extraction_target_dir, pwd=password.encode())
-                await redis_client.publish("notifications", json.dumps({
-                    "task_id": task_id, "status": "progress", "progress": 100, "detail": f"Найден пароль: {password}"
-                }))
-                return password
-            except (rarfile.BadRarFile, rarfile.RarCRCError):
-                progress = (processed_count / total_passwords) * 100 if total_passwords > 0 else 0
-                await redis_client.publish("notifications", json.dumps({
-                    "task_id": task_id, "status": "progress", "progress": int(progress), "detail": f"Проверка: {password[:1]}***{password[-1:] if len(password)>1 else ''} ({processed_count}/{total_passwords})"
-                }))
-            except Exception as e:
-                # Можно логировать или отправлять специфические ошибки, если это необходимо
-                logger.warning(f"Ошибка при проверке пароля '{password}': {e}")
-                # Продолжаем перебор
-    return None
+    already_checked = crack_cache.make_exhausted_filter(exhausted)
+    reporter = ProgressReporter(
+        redis_client, task_id, total_passwords,
+        counter_key=job_key(task_id, "processed"),
+        stop_keys=stop_keys(task_id),
+        ttl=FastApiServerInfo.JOB_RECOVERY_TTL,
+        interval=FastApiServerInfo.PROGRESS_INTERVAL,
+        batch=FastApiServerInfo.PROGRESS_BATCH,
+        checkpoint_key=job_key(task_id, "checkpoint"),
+        channel=task_channel(task_id),
+        checkpoint_field=checkpoint_field if checkpoint_field is not None else str(start),
+        keepalive=keepalive,
+        keepalive_interval=FastApiServerInfo.JOB_KEEPALIVE_INTERVAL,
+    )
+
+    async def report_found(password):
+        # Сообщаем остальным шардам, что перебор можно прекращать
+        await redis_client.set(job_key(task_id, "found"), password, ex=FastApiServerInfo.JOB_RECOVERY_TTL)
+        await redis_client.publish(task_channel(task_id), json.dumps({
+            "task_id": task_id, "status": "progress", "progress": 100, "detail": f"Найден пароль: {password}"
+        }))
+
+    kind = estimator.verifier_kind(hash_value) if hash_value else "extract"
+    if workers > 1 and not pool_available():
+        logger.warning(f"Task {task_id}: воркер запущен в prefork-пуле, пул из {workers} процессов недоступен - перебор в одном процессе")
+        workers = 1
+    started_at = time.monotonic()
+    try:
+        async with reporter:
+            if workers > 1:
+                # Процесс пула замечает флаг остановки только между диапазонами,
+                # поэтому диапазон рассчитан на POOL_CHUNK_SECONDS по измеренной скорости
+                rate = await estimator.get_rate(redis_client, kind)
+                found_password = await brute_force_pool(
+                    archive_path, space, start, stop, workers, extraction_target_dir,
+                    on_progress=reporter.advance,
+                    chunk_size=chunk_size_for(rate, FastApiServerInfo.POOL_CHUNK_SECONDS, FastApiServerInfo.POOL_CHUNK_SIZE),
+                    hash_value=hash_value,
+                    exhausted=exhausted,
+                )
+                if found_password:
+                    await reporter.flush()
+                    await report_found(found_password)
+                return found_password
+
+            for position, password in enumerate(make_space(space).iter(start, stop), start=start + 1):
+                # None - для этого индекса нет кандидата (отброшен правилом или повтор)
+                if password is None or (already_checked and already_checked(password)):
+                    if await reporter.advance(position=position, verified=0):
+                        return None
+                    continue
+                try:
+                    if checker(password):
+                        await reporter.flush()
+                        await report_found(password)
+                        return password
+                except Exception as e:
+                    # Можно логировать или отправлять специфические ошибки, если это необходимо
+                    logger.warning(f"Ошибка при проверке пароля '{password}': {e}")
+                    # Продолжаем перебор
+                if await reporter.advance(position=position):
+                    return None
+        return None
+    finally:
+        # Скорость одного процесса нужна API для оценки следующих задач
+        elapsed = time.monotonic() - started_at
+        # Отброшенные и уже перебранные кандидаты не проверялись и в скорость не входят
+        if reporter.verified and elapsed > 0:
+            await estimator.record_rate(redis_client, kind, reporter.verified / elapsed / workers)
+
+
+async def remember_result(redis_client, hash_value, password, charset, max_length):
+    """
+    Сохраняет в кеш найденный пароль или отмечает пространство ключей как перебранное.
+    Для режимов без пространства (charset, max_length) сохраняется только пароль.
+    """
+    if password:
+        await crack_cache.set_password(redis_client, hash_value, password)
+    elif charset is not None:
+        await crack_cache.add_exhausted(redis_client, hash_value, charset, max_length)
 
 
 # В name явно объявляю путь и имя "тяжелого" процесса
 @celery_app.task(bind=True, name="app.celery.tasks.long_running_parse")
 def long_running_parse(self):
-    r = aioredis.Redis(host=FastApiServerInfo.REDIS_HOST, port=FastApiServerInfo.REDIS_PORT, db=0)
+    loop = get_loop()
+    redis_client = get_redis()
     result = {"task_id": self.request.id, "status": "in progress"}
-    r.publish("notifications", json.dumps(result))
-    asyncio.sleep(5)
+    loop.run_until_complete(redis_client.publish(task_channel(self.request.id), json.dumps(result)))
+    loop.run_until_complete(asyncio.sleep(5))
     result = {"task_id": self.request.id, "status": "done"}
-    r.publish("notifications", json.dumps(result))
+    loop.run_until_complete(redis_client.publish(task_channel(self.request.id), json.dumps(result)))
     return result
 
-@celery_app.task(bind=True, name="app.celery.tasks.brute_force_rar_task")
-def brute_force_rar_task(self, file_content_b64: str, original_filename: str, charset: str, max_length: int):
-    task_id = self.request.id
-    redis_client = None
-    loop = asyncio.new_event_loop() # Создаем новый цикл событий для этой задачи
-    asyncio.set_event_loop(loop)
+@celery_app.task(bind=True, name="app.celery.tasks.brute_force_rar_task", max_retries=FastApiServerInfo.TASK_MAX_RETRIES)
+def brute_force_rar_task(self, blob_id: str, original_filename: str, charset: str, max_length: int, start: int = 0, stop: int = None, job_id: str = None, workers: int = 1, space: dict = None, user_id: int = None):
+    """
+    Перебирает пароли из диапазона [start, stop) пространства кандидатов space
+    (по умолчанию - полный перебор charset до длины max_length) в workers процессах.
+    Архив читается из общего хранилища по blob_id.
+    Если задан job_id, задача является шардом общей задачи: уведомления отправляются
+    от имени job_id, а итоговый результат публикует merge_brute_force_shards.
+    При повторе задачи или повторной доставке после падения воркера перебор
+    продолжается с последней контрольной точки диапазона.
+    """
+    task_id = job_id or self.request.id
+    is_shard = job_id is not None
+    # Ошибка шарда не итоговая для задачи: итог (в том числе "error") опубликует merge_brute_force_shards,
+    # а подписка на канал задачи снимается по первому итоговому статусу
+    error_status = "shard_error" if is_shard else "error"
+    space = space or bruteforce_spec(charset, max_length)
+    retrying = False
+    # Цикл событий и пул соединений с Redis общие для всех задач процесса воркера
+    loop = get_loop()
+    redis_client = get_redis()
 
     # Создаем уникальную временную директорию для этой задачи
     temp_task_dir = os.path.join(TEMP_DIR_CELERY, str(uuid.uuid4()))
     os.makedirs(temp_task_dir, exist_ok=True)
 
-    temp_archive_path = os.path.join(temp_task_dir, original_filename)
-    # Имя файла для хеша будет без расширения исходного файла + .txt
-    base_name_for_outputs = os.path.splitext(original_filename)[0]
-    temp_hash_file_path = os.path.join(temp_task_dir, base_name_for_outputs + '.txt')
-    temp_passwords_file_path = os.path.join(temp_task_dir, base_name_for_outputs + '_passwords.txt')
-
     try:
-        redis_client = aioredis.Redis(host=FastApiServerInfo.REDIS_HOST, port=FastApiServerInfo.REDIS_PORT, db=0)
+        # Шард, до которого очередь дошла после нахождения пароля или отмены, сразу завершается
+        if loop.run_until_complete(redis_client.exists(*stop_keys(task_id))):
+            return {"task_id": task_id, "status": "cancelled", "result": None, "detail": "Пароль найден другим шардом или задача отменена"}
 
-        loop.run_until_complete(redis_client.publish("notifications", json.dumps({
+        loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
             "task_id": task_id, "status": "starting", "progress": 0, "detail": "Задача запущена"
         })))
 
-        try:
-            file_content = base64.b64decode(file_content_b64)
-            with open(temp_archive_path, "wb") as f:
-                f.write(file_content)
-        except Exception as e:
-            loop.run_until_complete(redis_client.publish("notifications", json.dumps({
-                "task_id": task_id, "status": "error", "detail": f"Ошибка сохранения файла: {e}"
+        temp_archive_path = blob_path(blob_id)
+        if not os.path.exists(temp_archive_path):
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
+                "task_id": task_id, "status": error_status, "detail": "Архив не найден в хранилище"
             })))
-            logger.error(f"Task {task_id}: Ошибка сохранения файла {original_filename}: {e}", exc_info=True)
-            result_on_error = {"task_id": task_id, "status": "error", "detail": "File save error"}
-            logger.info(f"Task {task_id} returning on file save error: {result_on_error}")
+            logger.error(f"Task {task_id}: blob {blob_id} ({original_filename}) не найден в {temp_archive_path}")
+            result_on_error = {"task_id": task_id, "status": "error", "detail": "Blob not found"}
+            logger.info(f"Task {task_id} returning on missing blob: {result_on_error}")
             return result_on_error
+        # Пока шард работает, архив не должен удалить очистка хранилища
+        touch_blob(blob_id)
+
+        async def keepalive():
+            touch_blob(blob_id)
+            await redis_client.expire(job_key(task_id, "meta"), FastApiServerInfo.JOB_RECOVERY_TTL)
+            if user_id is not None:
+                # Квота и очередь пользователя не должны истечь, пока его задача выполняется
+                for pending_blob_id in await scheduler.touch(redis_client, user_id, lambda job_id: job_key(job_id, "meta")):
+                    touch_blob(pending_blob_id)
 
-        loop.run_until_complete(redis_client.publish("notifications", json.dumps({
+        loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
             "task_id": task_id, "status": "extracting_hash", "progress": 5, "detail": "Извлечение хеша..."
         })))
         
-        hash_value = loop.run_until_complete(asyncio.to_thread(extract_rar_hash_celery, temp_archive_path))
+        hash_value = loop.run_until_complete(crack_cache.get_archive_hash(redis_client, blob_id))
         if not hash_value:
-            loop.run_until_complete(redis_client.publish("notifications", json.dumps({
-                "task_id": task_id, "status": "error", "detail": "Не удалось извлечь хеш."
+            hash_value = loop.run_until_complete(asyncio.to_thread(extract_hash_celery, temp_archive_path, original_filename))
+            if hash_value:
+                loop.run_until_complete(crack_cache.set_archive_hash(redis_client, blob_id, hash_value))
+        if not hash_value:
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
+                "task_id": task_id, "status": error_status, "detail": "Не удалось извлечь хеш."
             })))
             logger.warning(f"Task {task_id}: Не удалось извлечь хеш для {original_filename}.")
             result_on_error = {"task_id": task_id, "status": "error", "detail": "Hash extraction failed"}
             logger.info(f"Task {task_id} returning on hash extraction error: {result_on_error}")
             return result_on_error
+        if not extractors.is_crackable(hash_value):
+            detail = f"Хеш формата {extractors.hash_format(hash_value)} извлечён, но подбор пароля для него пока не поддерживается."
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
+                "task_id": task_id, "status": error_status, "hash": hash_value, "detail": detail
+            })))
+            return {"task_id": task_id, "status": "error", "hash": hash_value, "detail": detail}
         
-        loop.run_until_complete(redis_client.publish("notifications", json.dumps({
-            "task_id": task_id, "status": "generating_passwords", "progress": 10, "hash": hash_value, "detail": "Генерация паролей..."
-        })))
-        total_passwords = loop.run_until_complete(asyncio.to_thread(generate_passwords_celery, charset, max_length, temp_passwords_file_path))
+        # Пароли не записываются в файл: перебор идёт по ленивому пространству кандидатов
+        total_passwords = make_space(space).size
         if total_passwords == 0:
-            loop.run_until_complete(redis_client.publish("notifications", json.dumps({
-                "task_id": task_id, "status": "error", "detail": "Не сгенерировано паролей (возможно, пустой charset или max_length=0)."
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
+                "task_id": task_id, "status": error_status, "detail": "Не сгенерировано паролей (возможно, пустой charset, max_length=0 или пустой словарь)."
             })))
             logger.warning(f"Task {task_id}: Не сгенерировано паролей для {original_filename} с charset='{charset}', max_length={max_length}.")
             result_on_error = {"task_id": task_id, "status": "error", "detail": "No passwords generated"}
             logger.info(f"Task {task_id} returning on no passwords generated: {result_on_error}")
             return result_on_error
 
-        loop.run_until_complete(redis_client.publish("notifications", json.dumps({
-            "task_id": task_id, "status": "bruteforcing", "progress": 15, "detail": f"Начинаем подбор из {total_passwords} паролей..."
-        })))
-        
-        found_password = loop.run_until_complete(brute_force_rar_celery(
-            task_id, temp_archive_path, temp_passwords_file_path, total_passwords, redis_client, temp_task_dir
-        ))
+        # Этот хеш мог быть уже взломан при загрузке другого архива
+        found_password = loop.run_until_complete(crack_cache.get_password(redis_client, hash_value))
+        if found_password:
+            loop.run_until_complete(redis_client.set(job_key(task_id, "found"), found_password, ex=FastApiServerInfo.JOB_RECOVERY_TTL))
+        else:
+            exhausted = loop.run_until_complete(crack_cache.get_exhausted(redis_client, hash_value))
+            checkpoint = loop.run_until_complete(redis_client.hget(job_key(task_id, "checkpoint"), str(start)))
+            resume_from = max(start, int(checkpoint)) if checkpoint else start
+            if resume_from > start:
+                detail = f"Продолжаем подбор с контрольной точки {resume_from}..."
+            else:
+                detail = f"Начинаем подбор из {total_passwords} паролей..."
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
+                "task_id": task_id, "status": "bruteforcing", "progress": 15, "hash": hash_value, "detail": detail
+            })))
 
+            found_password = loop.run_until_complete(brute_force_rar_celery(
+                task_id, temp_archive_path, space, total_passwords, redis_client, temp_task_dir,
+                start=resume_from, stop=stop, workers=max(1, min(workers, os.cpu_count() or 1)), hash_value=hash_value,
+                exhausted=exhausted, checkpoint_field=str(start),
+                keepalive=keepalive
+            ))
+
+        if is_shard:
+            # Итоговое уведомление отправит merge_brute_force_shards после завершения всех шардов
+            if found_password:
+                shard_status = "completed"
+            elif loop.run_until_complete(redis_client.exists(*stop_keys(task_id))):
+                shard_status = "cancelled"
+            else:
+                shard_status = "failed"
+            return {"task_id": task_id, "status": shard_status, "result": found_password, "hash": hash_value}
+
+        if not found_password and loop.run_until_complete(redis_client.exists(job_key(task_id, "cancelled"))):
+            final_status = {"task_id": task_id, "status": "cancelled", "progress": None, "result": None, "hash": hash_value, "detail": "Задача отменена."}
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps(final_status)))
+            logger.info(f"Task {task_id} returning: {final_status}")
+            return final_status
+
+        if found_password or is_exhaustive(space):
+            loop.run_until_complete(remember_result(redis_client, hash_value, found_password, charset, max_length))
         if found_password:
             final_status = {"task_id": task_id, "status": "completed", "progress": 100, "result": found_password, "hash": hash_value, "detail": "Пароль найден!"}
-            loop.run_until_complete(redis_client.publish("notifications", json.dumps(final_status)))
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps(final_status)))
             logger.info(f"Task {task_id} returning: {final_status}")
             return final_status
         else:
             final_status = {"task_id": task_id, "status": "failed", "progress": 100, "result": None, "hash": hash_value, "detail": "Пароль не найден."}
-            loop.run_until_complete(redis_client.publish("notifications", json.dumps(final_status)))
+            loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps(final_status)))
             logger.info(f"Task {task_id} returning: {final_status}")
             return final_status
 
     except Exception as e:
         error_detail = f"Произошла непредвиденная ошибка в задаче: {type(e).__name__} - {e}"
         logger.error(f"Task {task_id}: {error_detail}", exc_info=True)
-        if redis_client:
-            loop.run_until_complete(redis_client.publish("notifications", json.dumps({
-                "task_id": task_id, "status": "error", "detail": error_detail
-            })))
+        if self.request.retries < self.max_retries:
+            # Повтор продолжит перебор с контрольной точки
+            retrying = True
+            raise self.retry(exc=e, countdown=FastApiServerInfo.TASK_RETRY_DELAY)
+        loop.run_until_complete(redis_client.publish(task_channel(task_id), json.dumps({
+            "task_id": task_id, "status": error_status, "detail": error_detail
+        })))
         result_on_error = {"task_id": task_id, "status": "error", "detail": error_detail}
         logger.info(f"Task {task_id} returning on general error: {result_on_error}")
         return result_on_error
     finally:
-        if redis_client:
-            loop.run_until_complete(redis_client.close())
+        if not is_shard and not retrying:
+            loop.run_until_complete(redis_client.delete(*job_keys(task_id)))
         if os.path.exists(temp_task_dir):
             try:
                 shutil.rmtree(temp_task_dir) # Рекурсивно удаляем временную директорию задачи
             except OSError as e:
                 logger.error(f"Ошибка удаления временной директории {temp_task_dir}: {e}")
-        loop.close()
\ No newline at end of file
+
+
+@celery_app.task(bind=True, name="app.celery.tasks.merge_brute_force_shards")
+def merge_brute_force_shards(self, shard_results, job_id: str, charset: str = None, max_length: int = None, user_id: int = None):
+    """
+    Callback chord-а: объединяет результаты шардов, сохраняет их в кеш,
+    публикует итог задачи job_id и передаёт слот пользователя его следующей задаче.
+    """
+    loop = get_loop()
+    redis_client = get_redis()
+    found = next((r for r in shard_results if r and r.get("status") == "completed"), None)
+    hash_value = next((r.get("hash") for r in shard_results if r and r.get("hash")), None)
+    # Пространство ключей считается перебранным, только если все шарды дошли до конца
+    all_failed = all(r and r.get("status") == "failed" for r in shard_results)
+    if hash_value and (found or (all_failed and charset is not None)):
+        loop.run_until_complete(remember_result(redis_client, hash_value, found and found["result"], charset, max_length))
+    if found:
+        final_status = {"task_id": job_id, "status": "completed", "progress": 100, "result": found["result"], "hash": hash_value, "detail": "Пароль найден!"}
+    elif loop.run_until_complete(redis_client.exists(job_key(job_id, "cancelled"))):
+        final_status = {"task_id": job_id, "status": "cancelled", "result": None, "hash": hash_value, "detail": "Задача отменена."}
+    elif any(r and r.get("status") == "error" for r in shard_results):
+        errors = "; ".join(r["detail"] for r in shard_results if r and r.get("status") == "error")
+        final_status = {"task_id": job_id, "status": "error", "result": None, "hash": hash_value, "detail": errors}
+    else:
+        final_status = {"task_id": job_id, "status": "failed", "progress": 100, "result": None, "hash": hash_value, "detail": "Пароль не найден."}
+    loop.run_until_complete(redis_client.publish(task_channel(job_id), json.dumps(final_status)))
+    loop.run_until_complete(redis_client.delete(*job_keys(job_id)))
+    if user_id is not None:
+        next_job = loop.run_until_complete(release_user_slot(redis_client, user_id))
+        if next_job:
+            dispatch_brute_force(next_job)
+    logger.info(f"Task {job_id} returning: {final_status}")
+    return final_status
+
+
+async def release_user_slot(redis_client, user_id):
+    """
+    Освобождает слот пользователя. Если слот передан его следующей задаче из очереди,
+    помечает её запущенной и возвращает её описание для dispatch_brute_force.
+    """
+    next_job = await scheduler.release(redis_client, user_id)
+    if not next_job:
+        return None
+    next_job = json.loads(next_job)
+    meta_key = job_key(next_job["job_id"], "meta")
+    await redis_client.hset(meta_key, "state", "running")
+    await redis_client.expire(meta_key, FastApiServerInfo.JOB_RECOVERY_TTL)
+    return next_job
+
+
+def job_space(job):
+    """
+    Описание пространства кандидатов задачи. У задач, поставленных в очередь
+    до появления режимов перебора, его нет - это полный перебор.
+    """
+    return job.get("space") or bruteforce_spec(job["charset"], job["max_length"])
+
+
+def dispatch_brute_force(job):
+    """
+    Запускает задачу перебора: делит пространство ключей на шарды и отправляет их
+    chord-ом в очередь, выбранную по размеру пространства. Итог собирает
+    merge_brute_force_shards, id которого совпадает с job["job_id"].
+    Возвращает имя очереди.
+    """
+    space = job_space(job)
+    total_passwords = make_space(space).size
+    queue = job["queue"]
+    header = [
+        brute_force_rar_task.s(
+            blob_id=job["blob_id"],
+            original_filename=job["original_filename"],
+            charset=job["charset"],
+            max_length=job["max_length"],
+            start=start,
+            stop=stop,
+            job_id=job["job_id"],
+            workers=job["workers"],
+            space=space,
+            user_id=job.get("user_id")
+        ).set(queue=queue)
+        for start, stop in split_keyspace(total_passwords, job["shards"])
+    ]
+    # Перебранное пространство (charset, max_length) запоминается только для полного перебора
+    exhaustive = is_exhaustive(space)
+    callback = merge_brute_force_shards.s(
+        job_id=job["job_id"],
+        charset=job["charset"] if exhaustive else None,
+        max_length=job["max_length"] if exhaustive else None,
+        user_id=job.get("user_id")
+    )
+    # Callback короткий, поэтому всегда идёт в быструю очередь
+    chord(header)(callback.set(task_id=job["job_id"], queue=FastApiServerInfo.SHORT_QUEUE))
+    return queue
@@ -24,9 +24,12 @@ class AsyncClient:
             "task": self.create_task,
             "clear": self.clear_console,
             "brut": self.brut_rar_task, 
+            "status": self.task_status,
+            "cancel": self.cancel_task,
             "exit": self.exit
         }
         
+        self.ws = None
         self.ws_task: asyncio.Task = None
         self.input_task: asyncio.Task = None
         self.active_tasks = list()
@@ -44,21 +47,40 @@ class AsyncClient:
             sys.stdout.flush()
 
 
+    async def ws_send(self, payload: dict):
+        # Сервер присылает только уведомления задач, на которые подписано соединение
+        if self.ws:
+            try:
+                await self.ws.send(json.dumps(payload))
+            except Exception as e:
+                await self.async_print(f"WebSocket error: {str(e)}")
+
+    async def subscribe(self, task_id: str):
+        self.active_tasks.append(task_id)
+        await self.ws_send({"action": "subscribe", "task_id": task_id})
+
     async def listener(self):
         while self.running:
             try:
 
                 async with websockets.connect(self.ws_url) as ws:
+                    self.ws = ws
+                    # После переподключения восстанавливаем подписки
+                    if self.user_token:
+                        await self.ws_send({"action": "auth", "token": self.user_token})
+                    for task_id in self.active_tasks:
+                        await self.ws_send({"action": "subscribe", "task_id": task_id})
                     async for message in ws:
                         data = json.loads(message)
 
                         task_id_from_notification = data.get('task_id')
                         if task_id_from_notification and task_id_from_notification in self.active_tasks:
                             await self.notification_func(json.dumps(data, ensure_ascii=False, indent=4))
-                            if data["status"] == "done":
+                            if data["status"] in ("done", "completed", "failed", "cancelled", "error"):
                                 self.active_tasks.remove(data['task_id'])
 
             except Exception as e:
+                self.ws = None
                 await self.async_print(f"WebSocket error: {str(e)}")
                 await asyncio.sleep(5)
                 
@@ -76,6 +98,7 @@ class AsyncClient:
                     data = response.json()
                     self.user_token = data['token']
                     self.user_email = data['email']
+                    await self.ws_send({"action": "auth", "token": self.user_token})
                     await self.async_print("Успешная авторизация!")
                 else:
                     await self.async_print(f"Ошибка: {response.text}")
@@ -97,6 +120,7 @@ class AsyncClient:
                     data = response.json()
                     self.user_token = data['token']
                     self.user_email = data['email']
+                    await self.ws_send({"action": "auth", "token": self.user_token})
                     await self.async_print("Регистрация успешна!")
                 else:
                     await self.async_print(f"Ошибка: {response.text}")
@@ -119,7 +143,7 @@ class AsyncClient:
                 data = response.json()
                 task_id = data.get('task_id')
                 if task_id:
-                    self.active_tasks.append(task_id)
+                    await self.subscribe(task_id)
                     await self.async_print(f"Задача {task_id} запущена.")
                 else:
                     await self.async_print(f"Не удалось получить ID задачи: {data}")
@@ -129,16 +153,39 @@ class AsyncClient:
 
     async def brut_rar_task(self):
         file_path = await self.session.prompt_async("Путь к RAR файлу: ")
-        charset = await self.session.prompt_async("Набор символов (например, abc123): ")
-        try:
-            max_length_str = await self.session.prompt_async("Максимальная длина пароля (до 8): ")
-            max_length = int(max_length_str)
-            if not 1 <= max_length <= 8:
-                await self.async_print("Максимальная длина должна быть от 1 до 8.")
+        mode = (await self.session.prompt_async("Режим (bruteforce/wordlist/mask/markov) [bruteforce]: ")).strip() or "bruteforce"
+        if mode == "mask":
+            mask = (await self.session.prompt_async("Маска (например, ?u?l?l?l?d?d): ")).strip()
+            charsets = (await self.session.prompt_async("Пользовательские наборы ?1..?4 через пробел (можно пусто): ")).split()
+            data = {"mode": mode, "mask": mask, "custom_charsets": json.dumps(charsets)}
+            increment = (await self.session.prompt_async("Перебирать префиксы маски, min-max (например, 4-6, можно пусто): ")).strip()
+            if increment:
+                try:
+                    low, _, high = increment.partition("-")
+                    data["increment_min"] = int(low or 1)
+                    if high:
+                        data["increment_max"] = int(high)
+                except ValueError:
+                    await self.async_print("Некорректные границы длины префиксов.")
+                    return
+                data["increment"] = "true"
+        elif mode == "wordlist":
+            rules = (await self.session.prompt_async(f"Наборы правил через запятую [{FastApiServerInfo.DEFAULT_RULES}]: ")).strip()
+            data = {"mode": mode, "rules": rules or FastApiServerInfo.DEFAULT_RULES}
+        else:
+            charset = await self.session.prompt_async(
+                "Набор символов (например, abc123" + (" или digits.chr): " if mode == "markov" else "): ")
+            )
+            try:
+                max_length_str = await self.session.prompt_async("Максимальная длина пароля: ")
+                max_length = int(max_length_str)
+                if max_length < 1:
+                    await self.async_print("Максимальная длина должна быть не меньше 1.")
+                    return
+            except ValueError:
+                await self.async_print("Некорректная максимальная длина пароля.")
                 return
-        except ValueError:
-            await self.async_print("Некорректная максимальная длина пароля.")
-            return
+            data = {"mode": mode, "charset": charset, "max_length": max_length}
 
         async with httpx.AsyncClient() as client:
             try:
@@ -155,7 +202,6 @@ class AsyncClient:
 
                 with open(file_path, "rb") as f:
                     files = {"file": (os.path.basename(file_path), f, "application/x-rar-compressed")}
-                    data = {"charset": charset, "max_length": max_length}
                     # Копируем файл в локальное временное хранилище клиента
                     # copied_file_name = os.path.basename(file_path) # Закомментировано, т.к. файл уже открыт как 'f'
                     # local_copied_path = os.path.join(CLIENT_TEMP_STORAGE_DIR, copied_file_name) # И не используется далее
@@ -170,9 +216,16 @@ class AsyncClient:
                 response.raise_for_status() # Проверка на HTTP ошибки
                 resp_data = response.json()
                 task_id = resp_data.get('task_id')
-                if task_id:
-                    self.active_tasks.append(task_id)
-                    await self.async_print(f"Задача брутфорса {task_id} запущена.")
+                if resp_data.get('status') in ("completed", "failed"):
+                    # Ответ из кеша сервера, задача не запускалась
+                    await self.async_print(f"{resp_data.get('message')} Результат: {resp_data.get('result')}")
+                elif task_id:
+                    await self.subscribe(task_id)
+                    estimate = resp_data.get('estimate') or {}
+                    await self.async_print(
+                        f"Задача брутфорса {task_id}: {resp_data.get('message')} "
+                        f"Паролей: {estimate.get('total')}, оценка времени: {estimate.get('seconds')} с."
+                    )
                 else:
                     await self.async_print(f"Не удалось получить ID задачи: {resp_data}")
             except FileNotFoundError:
@@ -182,6 +235,33 @@ class AsyncClient:
             except Exception as e:
                 await self.async_print(f"Ошибка: {str(e)}")
 
+    async def task_status(self):
+        task_id = await self.session.prompt_async("ID задачи: ")
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.get(f"{self.base_url}{FastApiServerInfo.GET_STATUS}{task_id}")
+                response.raise_for_status()
+                await self.async_print(json.dumps(response.json(), ensure_ascii=False, indent=4))
+            except httpx.HTTPStatusError as e:
+                await self.async_print(f"Ошибка HTTP: {e.response.status_code} - {e.response.text}")
+            except Exception as e:
+                await self.async_print(f"Ошибка: {str(e)}")
+
+    async def cancel_task(self):
+        task_id = await self.session.prompt_async("ID задачи: ")
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.delete(
+                    f"{self.base_url}{FastApiServerInfo.TASKS}{task_id}",
+                    headers={"Authorization": f"Bearer {self.user_token}"} if self.user_token else None
+                )
+                response.raise_for_status()
+                await self.async_print(f"Задача {task_id} отменяется.")
+            except httpx.HTTPStatusError as e:
+                await self.async_print(f"Ошибка HTTP: {e.response.status_code} - {e.response.text}")
+            except Exception as e:
+                await self.async_print(f"Ошибка: {str(e)}")
+
     async def clear_console(self):
         os.system("cls" if os.name == "nt" else "clear")
         await self.async_print("Консоль очищена")
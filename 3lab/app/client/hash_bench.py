@@ -0,0 +1,68 @@
+"""
+Бенчмарк входов в секунду при разной стоимости bcrypt.
+
+Для каждого числа раундов запускает concurrency одновременных "входов" (проверок
+пароля по хешу) через тот же ограниченный пул потоков, что и эндпоинт /login/,
+и измеряет пропускную способность и задержку цикла событий: при правильной
+разгрузке цикл событий остаётся отзывчивым во время всплеска входов.
+
+Запуск из каталога 3lab:
+    python -m app.client.hash_bench --rounds 8 10 12 --logins 64 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+from passlib.context import CryptContext
+
+from app.services import passwords
+
+
+async def event_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """
+    Максимальное опоздание пробуждения цикла событий, пока не выставлен stop.
+    """
+    worst = 0.0
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started_at - interval)
+    return worst
+
+
+async def bench(rounds: int, logins: int, concurrency: int) -> dict:
+    # Подменяем контекст модуля, чтобы verify_password считал хеши нужной стоимости
+    passwords.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    stored = passwords.pwd_context.hash("correct horse battery staple")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_login():
+        async with semaphore:
+            valid, _ = await passwords.verify_password("correct horse battery staple", stored)
+            assert valid
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(event_loop_lag(stop))
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    return {"rounds": rounds, "logins_per_sec": logins / elapsed, "seconds": elapsed, "loop_lag_ms": await lag_task * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[4, 8, 10, 12])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"Потоков хеширования: {passwords._executor._max_workers}")
+    print(f"{'раунды':>7} {'входов/с':>10} {'время, с':>9} {'лаг цикла, мс':>14}")
+    for rounds in args.rounds:
+        result = asyncio.run(bench(rounds, args.logins, args.concurrency))
+        print(f"{result['rounds']:>7} {result['logins_per_sec']:>10.1f} {result['seconds']:>9.2f} {result['loop_lag_ms']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
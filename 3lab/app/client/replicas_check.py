@@ -0,0 +1,101 @@
+"""
+Проверка маршрутизации уведомлений между несколькими репликами API.
+
+Запускает `uvicorn main:app --workers N` (каждый воркер - отдельная реплика со своими
+веб-сокетами и своей подпиской на Redis), открывает несколько соединений, подписывает
+каждое на собственную задачу и публикует в Redis сообщения от имени воркера Celery.
+Каждое соединение должно получить сообщения только своей задачи, на какую бы реплику
+оно ни попало.
+
+Запуск из каталога 3lab при работающем Redis:
+    python -m app.client.replicas_check --workers 4 --sockets 16
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from uuid import uuid4
+
+import redis.asyncio as aioredis
+import websockets
+
+from app.core.endpoints import FastApiServerInfo
+from app.services.channels import task_channel
+
+
+async def wait_for_server(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with websockets.connect(url):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def check(port: int, sockets: int, messages: int, timeout: float) -> bool:
+    url = f"ws://127.0.0.1:{port}/ws/notifications"
+    await wait_for_server(url, timeout)
+    redis_client = aioredis.Redis(host=FastApiServerInfo.REDIS_HOST, port=FastApiServerInfo.REDIS_PORT, db=FastApiServerInfo.REDIS_DB)
+
+    connections = [await websockets.connect(url) for _ in range(sockets)]
+    task_ids = [str(uuid4()) for _ in connections]
+    for ws, task_id in zip(connections, task_ids):
+        await ws.send(json.dumps({"action": "subscribe", "task_id": task_id}))
+    # Реплики подписываются на каналы асинхронно
+    await asyncio.sleep(1)
+
+    started_at = time.monotonic()
+    for number in range(messages):
+        for task_id in task_ids:
+            await redis_client.publish(task_channel(task_id), json.dumps({
+                "task_id": task_id, "status": "progress", "processed": number + 1, "ts": time.time()
+            }))
+
+    ok = True
+    for ws, task_id in zip(connections, task_ids):
+        received = []
+        try:
+            while len(received) < messages:
+                received.append(json.loads(await asyncio.wait_for(ws.recv(), timeout)))
+        except asyncio.TimeoutError:
+            pass
+        foreign = [m for m in received if m.get("task_id") != task_id]
+        if len(received) != messages or foreign:
+            ok = False
+            print(f"\033[31m{task_id}: получено {len(received)} из {messages}, чужих {len(foreign)}\033[0m")
+        await ws.close()
+    elapsed = time.monotonic() - started_at
+    print(f"{sockets} соединений, {sockets * messages} сообщений за {elapsed:.2f} с")
+    await redis_client.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="число реплик (воркеров uvicorn)")
+    parser.add_argument("--sockets", type=int, default=8, help="число веб-сокет соединений")
+    parser.add_argument("--messages", type=int, default=20, help="сообщений на задачу")
+    parser.add_argument("--port", type=int, default=int(FastApiServerInfo.PORT) + 1)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers)
+    ])
+    try:
+        ok = asyncio.run(check(args.port, args.sockets, args.messages, args.timeout))
+    finally:
+        server.terminate()
+        server.wait()
+    print("\033[32mOK\033[0m" if ok else "\033[31mFAIL\033[0m")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,89 @@ class FastApiServerInfo:
     UNRAR_TOOL = os.path.join(os.path.expandvars(r'%PROGRAMFILES%'),'WinRAR','UnRAR.exe')
     BRUT_HASH = "/brut_hash/"
     
-    # Рекомендуется использовать абсолютный путь или убедиться, что rar2john есть в PATH воркера Celery
-    RAR2JOHN_PATH = "Johntheripper/run/rar2john.exe" # Пример, настройте по необходимости
+    # Каталог со скриптами *2john.py, которые загружаются в процесс воркера
+    JOHN_RUN_DIR = os.path.join("Johntheripper", "run")
     
     GET_STATUS = "/get_status/"
+    TASKS = "/tasks/"
+    NOTIFY_METRICS = "/metrics/notifications"
+    # Размер очереди неотправленных уведомлений одного веб-сокета
+    WS_QUEUE_SIZE = 100
+    # Буфер уведомлений между подпиской Redis и рассылкой по веб-сокетам
+    NOTIFY_BUFFER_SIZE = 10000
+    # Задержка переподключения подписки к Redis, секунды
+    NOTIFY_RECONNECT_MIN = 0.5
+    NOTIFY_RECONNECT_MAX = 30
+    # Каналы уведомлений: общий служебный, отдельный канал на задачу и на пользователя.
+    # Каждая реплика API подписана только на каналы задач и пользователей своих соединений
+    NOTIFY_CHANNEL = "notifications"
+    TASK_CHANNEL = "notifications:task:{task_id}"
+    USER_CHANNEL = "notifications:user:{user_id}"
+
+    # Словари и правила мутации для режима wordlist (из поставки John the Ripper)
+    WORDLIST_DIR = os.path.join("Johntheripper", "run")
+    RULES_DIR = os.path.join("Johntheripper", "run", "rules")
+    DEFAULT_WORDLIST = "password.lst"
+    DEFAULT_RULES = "best64"
+
+    # Общее для API и воркеров хранилище загруженных архивов
+    BLOB_DIR = os.path.join("app", "temp_files", "blobs")
+    # Файлы, которые читают выполняющиеся задачи, воркеры регулярно обновляют (touch_blob)
+    BLOB_TTL = 24 * 3600
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    # Время хранения извлечённых хешей и найденных паролей в кеше, секунды
+    CRACK_CACHE_TTL = 30 * 24 * 3600
+
+    # На сколько шардов делится пространство ключей (по числу воркеров Celery)
+    BRUT_SHARDS = 2
+    # Верхняя граница числа шардов, которое может запросить клиент
+    MAX_BRUT_SHARDS = 16
+    # Время жизни общего состояния задачи в Redis, секунды
+    JOB_STATE_TTL = 3600
+    # Число процессов проверки паролей внутри одной задачи (1 - без пула).
+    # Процессы prefork-пула Celery - демоны и не могут порождать процессы, поэтому пул
+    # работает только в воркере с --pool solo; иначе шард перебирает пароли в одном процессе
+    BRUT_POOL_WORKERS = 1
+    # Очередь длинных задач обслуживают воркеры с --pool solo. В поставляемом docker-compose.yml
+    # воркеры prefork, поэтому workers > 1 отклоняется и не учитывается в оценке длительности
+    BRUT_POOL_ENABLED = False
+    # Наибольший размер непрерывного диапазона паролей, выдаваемого процессу пула за раз
+    POOL_CHUNK_SIZE = 1000
+    # Диапазон рассчитан на столько секунд проверки по измеренной скорости:
+    # отмена и найденный другим шардом пароль замечаются не позже
+    POOL_CHUNK_SECONDS = 1.0
+    # Прогресс публикуется не чаще раза в PROGRESS_INTERVAL секунд или раз в PROGRESS_BATCH паролей
+    PROGRESS_INTERVAL = 1.0
+    PROGRESS_BATCH = 1000
+    # Как часто выполняющаяся задача продлевает свои ресурсы (время архива в хранилище), секунды
+    JOB_KEEPALIVE_INTERVAL = 60
+    # Очереди Celery: задачи с оценкой до INTERACTIVE_JOB_SECONDS идут в короткую,
+    # более длинные - в очередь длинных задач, дольше MAX_JOB_SECONDS - отклоняются
+    SHORT_QUEUE = "short"
+    LONG_QUEUE = "long"
+    INTERACTIVE_JOB_SECONDS = 60
+    MAX_JOB_SECONDS = 12 * 3600
+    # Сколько шардов реально выполняется одновременно (сумма --concurrency воркеров
+    # очереди длинных задач) и сколько процессов пула можно запросить на шард:
+    # по ним, а не по запрошенным клиентом значениям, оценивается параллельность
+    CELERY_WORKER_SLOTS = 2
+    MAX_BRUT_POOL_WORKERS = 8
+    # Наибольшая длина пароля в режиме markov: таблицы числа кортежей по длине и сумме
+    # рангов строятся до проверки бюджета, время и память растут квадратично по длине
+    MAX_MARKOV_LENGTH = 32
+    # Скорость проверки паролей одним процессом, пока нет измерений, паролей в секунду
+    DEFAULT_GUESS_RATE = 20
+    # Сколько задач перебора один пользователь может выполнять одновременно
+    USER_MAX_ACTIVE_JOBS = 2
+    # Повторы задачи перебора при непредвиденной ошибке
+    TASK_MAX_RETRIES = 3
+    TASK_RETRY_DELAY = 5
+    # Через сколько секунд неподтверждённая задача будет доставлена другому воркеру.
+    # Должно превышать длительность самой долгой задачи: берётся с запасом на ошибку оценки
+    BROKER_VISIBILITY_TIMEOUT = 2 * MAX_JOB_SECONDS
+    # Контрольные точки, счётчик прогресса и флаги found/cancelled должны дожить до повторной
+    # доставки шарда после падения воркера; после завершения задачи их удаляет merge
+    JOB_RECOVERY_TTL = BROKER_VISIBILITY_TIMEOUT + JOB_STATE_TTL
     LONG = "/long/"
     
     PORT = "8001"
@@ -20,6 +99,16 @@ class FastApiServerInfo:
     REDIS_PORT = 6379
     REDIS_DB = 0
     REDIS_PASSWORD = ''
+    # Максимум соединений в пуле Redis одного процесса воркера
+    REDIS_POOL_SIZE = 10
+    # Число соединений с SQLite в пуле приложения
+    DB_POOL_SIZE = 4
+    # Кеш "токен -> пользователь": число записей и время жизни записи, секунды
+    TOKEN_CACHE_SIZE = 10000
+    TOKEN_CACHE_TTL = 300
+    # Стоимость bcrypt (log2 числа раундов) и число потоков для хеширования паролей
+    BCRYPT_ROUNDS = 12
+    PASSWORD_HASH_WORKERS = 2
     
     REDIS_BROKER = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
     REDIS_BACKEND =  f"redis://{REDIS_HOST}:{REDIS_PORT}/1"
\ No newline at end of file
@@ -11,4 +11,4 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     password = Column(String)
-    # token = Column(String)
+    token = Column(String, unique=True, index=True)
@@ -0,0 +1,86 @@
+"""
+Контентно-адресуемое хранилище загруженных архивов на общем диске.
+
+API потоково пишет загрузку на диск кусками, одновременно считая SHA-256,
+и сохраняет файл под именем, равным хешу содержимого. В сообщение Celery
+попадает только этот идентификатор, а воркер читает архив прямо из хранилища.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+
+from app.core.endpoints import FastApiServerInfo
+
+BLOB_DIR = FastApiServerInfo.BLOB_DIR
+BLOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def blob_path(blob_id):
+    """
+    Путь к файлу в хранилище. Проверяет идентификатор, чтобы исключить выход за пределы BLOB_DIR.
+    """
+    if not BLOB_ID_RE.match(blob_id):
+        raise ValueError(f"Некорректный идентификатор blob: {blob_id}")
+    return os.path.join(BLOB_DIR, blob_id)
+
+
+async def save_upload(upload, chunk_size=FastApiServerInfo.UPLOAD_CHUNK_SIZE):
+    """
+    Потоково сохраняет UploadFile в хранилище и возвращает его идентификатор (SHA-256 в hex).
+    Запись на диск выполняется в потоке, чтобы не блокировать цикл событий.
+    """
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(BLOB_DIR, f".{uuid.uuid4()}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := await upload.read(chunk_size):
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        blob_id = digest.hexdigest()
+        path = blob_path(blob_id)
+        if os.path.exists(path):
+            # Такой архив уже загружали: обновляем время, чтобы его не удалила очистка
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+        return blob_id
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def touch_blob(blob_id):
+    """
+    Продлевает жизнь файла в хранилище: очистка удаляет файлы по времени изменения.
+    """
+    try:
+        os.utime(blob_path(blob_id))
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired_blobs(max_age=FastApiServerInfo.BLOB_TTL):
+    """
+    Удаляет из хранилища файлы, к которым не обращались дольше max_age секунд.
+    Файлы выполняющихся задач воркеры продлевают через touch_blob.
+    Обходит каталог синхронно - из цикла событий вызывается через asyncio.to_thread.
+    """
+    if not os.path.isdir(BLOB_DIR):
+        return 0
+    removed = 0
+    deadline = time.time() - max_age
+    for entry in os.scandir(BLOB_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Файл уже удалил другой процесс
+            pass
+    return removed
@@ -0,0 +1,68 @@
+"""
+Пространства паролей-кандидатов для разных режимов перебора.
+
+Задача перебора описывается словарём spec, который целиком передаётся в Celery
+и в процессы пула, например:
+    {"mode": "bruteforce", "charset": "abc123", "max_length": 6}
+    {"mode": "wordlist", "wordlist": "password.lst", "rules": ["best64"]}
+    {"mode": "mask", "mask": "?u?l?l?l?d?d", "charsets": ["?l?d_"]}
+    {"mode": "mask", "mask": "?d?d?d?d?d?d", "increment": True, "increment_min": 4, "increment_max": None}
+    {"mode": "markov", "charset": "digits.chr", "max_length": 8, "threshold": None}
+make_space(spec) возвращает пространство с размером size и методом iter(start, stop),
+который лениво выдаёт кандидатов с индексами [start, stop). Вместо индекса, для которого
+кандидата нет (отброшен правилом, повтор), выдаётся None - индексы не сдвигаются,
+и шарды, контрольные точки и прогресс работают одинаково для всех режимов.
+"""
+from typing import Iterator, Optional
+
+from app.services.keyspace import iter_passwords, keyspace_size
+from app.services.markov import make_markov_space, resolve_charset
+from app.services.mask import MaskSpace
+from app.services.wordlist import make_wordlist_space
+
+MODES = ("bruteforce", "wordlist", "mask", "markov")
+
+
+class KeyspaceSpace:
+    def __init__(self, charset: str, max_length: int):
+        self.charset = charset
+        self.max_length = max_length
+        self.size = keyspace_size(charset, max_length)
+
+    def iter(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Optional[str]]:
+        return iter_passwords(self.charset, self.max_length, start=start, stop=stop)
+
+
+def bruteforce_spec(charset: str, max_length: int) -> dict:
+    return {"mode": "bruteforce", "charset": charset, "max_length": max_length}
+
+
+def make_space(spec: dict):
+    """
+    Строит пространство кандидатов по описанию spec. ValueError - некорректное описание.
+    """
+    mode = spec.get("mode", "bruteforce")
+    if mode == "bruteforce":
+        if not spec.get("charset") or not spec.get("max_length"):
+            raise ValueError("Для полного перебора нужны charset и max_length")
+        return KeyspaceSpace(spec["charset"], int(spec["max_length"]))
+    if mode == "wordlist":
+        return make_wordlist_space(spec["wordlist"], spec.get("rules") or [])
+    if mode == "mask":
+        return MaskSpace(spec.get("mask") or "", spec.get("charsets") or (), bool(spec.get("increment")),
+                         spec.get("increment_min") or 1, spec.get("increment_max"))
+    if mode == "markov":
+        return make_markov_space(spec.get("charset") or "", int(spec.get("max_length") or 0), threshold=spec.get("threshold"))
+    raise ValueError(f"Неизвестный режим перебора: {mode}")
+
+
+def is_exhaustive(spec: dict) -> bool:
+    """
+    Режимы, полный перебор которых можно записать в кеш как пространство (charset, max_length):
+    полный перебор и марковский порядок без ограничения threshold (те же пароли в другом порядке).
+    """
+    mode = spec.get("mode", "bruteforce")
+    if mode == "markov":
+        threshold = spec.get("threshold")
+        return not threshold or threshold >= len(resolve_charset(spec.get("charset") or ""))
+    return mode == "bruteforce"
@@ -0,0 +1,17 @@
+"""
+Имена каналов Redis для уведомлений.
+
+Воркеры публикуют сообщения задачи в её собственный канал, а API при запуске задачи
+сообщает о ней в канал пользователя. Реплика API подписывается только на каналы
+задач и пользователей, у которых есть соединения именно на ней, поэтому Redis
+сам доставляет каждое сообщение лишь тем репликам, где его ждут.
+"""
+from app.core.endpoints import FastApiServerInfo
+
+
+def task_channel(task_id) -> str:
+    return FastApiServerInfo.TASK_CHANNEL.format(task_id=task_id)
+
+
+def user_channel(user_id) -> str:
+    return FastApiServerInfo.USER_CHANNEL.format(user_id=user_id)
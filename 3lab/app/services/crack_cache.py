@@ -0,0 +1,111 @@
+"""
+Кеш результатов взлома в Redis.
+
+Хранит:
+    crack:blob:<sha256 архива>:hash      - строку хеша, извлечённую из файла (app/services/extractors.py);
+    crack:hash:<sha256 хеша>:password    - найденный пароль;
+    crack:hash:<sha256 хеша>:exhausted   - множество полностью перебранных
+                                           пространств ключей (charset, max_length).
+Повторная отправка того же архива возвращается сразу, а перебор с другим набором
+символов пропускает пароли, уже проверенные ранее.
+"""
+import hashlib
+import json
+
+from app.core.endpoints import FastApiServerInfo
+from app.services.keyspace import normalize_charset
+
+CACHE_PREFIX = "crack"
+CACHE_TTL = FastApiServerInfo.CRACK_CACHE_TTL
+
+
+def _key(*parts):
+    return ":".join((CACHE_PREFIX,) + parts)
+
+
+def _text(value):
+    # Клиенты API и воркера создаются с разным decode_responses
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def normalize_hash(hash_value):
+    """
+    Отбрасывает префикс с именем файла ("путь:$rar5$...") - он зависит от места загрузки.
+    """
+    start = hash_value.find("$")
+    return (hash_value[start:] if start >= 0 else hash_value).strip()
+
+
+def hash_digest(hash_value):
+    return hashlib.sha256(normalize_hash(hash_value).encode("utf-8")).hexdigest()
+
+
+async def get_archive_hash(redis_client, blob_id):
+    return _text(await redis_client.get(_key("blob", blob_id, "hash")))
+
+
+async def set_archive_hash(redis_client, blob_id, hash_value):
+    await redis_client.set(_key("blob", blob_id, "hash"), hash_value, ex=CACHE_TTL)
+
+
+async def get_password(redis_client, hash_value):
+    return _text(await redis_client.get(_key("hash", hash_digest(hash_value), "password")))
+
+
+async def set_password(redis_client, hash_value, password):
+    await redis_client.set(_key("hash", hash_digest(hash_value), "password"), password, ex=CACHE_TTL)
+
+
+async def get_exhausted(redis_client, hash_value):
+    """
+    Возвращает список полностью перебранных пространств ключей [(charset, max_length), ...].
+    """
+    members = await redis_client.smembers(_key("hash", hash_digest(hash_value), "exhausted"))
+    exhausted = []
+    for member in members:
+        item = json.loads(_text(member))
+        exhausted.append((item["charset"], item["max_length"]))
+    return exhausted
+
+
+async def add_exhausted(redis_client, hash_value, charset, max_length):
+    key = _key("hash", hash_digest(hash_value), "exhausted")
+    member = json.dumps({"charset": normalize_charset(charset), "max_length": max_length}, sort_keys=True)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.sadd(key, member)
+        pipe.expire(key, CACHE_TTL)
+        await pipe.execute()
+
+
+async def lookup_archive(redis_client, blob_id):
+    """
+    Возвращает (hash_value, password, exhausted) для архива; неизвестные поля - None/[].
+    """
+    hash_value = await get_archive_hash(redis_client, blob_id)
+    if not hash_value:
+        return None, None, []
+    password = await get_password(redis_client, hash_value)
+    exhausted = await get_exhausted(redis_client, hash_value)
+    return hash_value, password, exhausted
+
+
+def is_covered(exhausted, charset, max_length):
+    """
+    True, если пространство (charset, max_length) целиком входит в одно из уже перебранных.
+    """
+    charset = set(charset)
+    return any(charset <= set(done) and max_length <= done_length for done, done_length in exhausted)
+
+
+def make_exhausted_filter(exhausted):
+    """
+    Возвращает функцию already_checked(password) -> bool или None, если пропускать нечего.
+    """
+    if not exhausted:
+        return None
+    spaces = [(frozenset(charset), max_length) for charset, max_length in exhausted]
+
+    def already_checked(password):
+        return any(len(password) <= max_length and set(password) <= charset for charset, max_length in spaces)
+
+    return already_checked
@@ -0,0 +1,59 @@
+"""
+Оценка стоимости задачи перебора до её запуска.
+
+Воркеры после каждого шарда сохраняют в Redis измеренную скорость проверки паролей
+одним процессом (скользящее среднее) отдельно для каждого способа проверки:
+хеш RAR5 с заданным числом итераций PBKDF2 или пробная распаковка архива.
+API по этой скорости оценивает время задачи и решает, принять её в интерактивную
+очередь, отправить в очередь длинных задач или отклонить.
+"""
+from app.core.endpoints import FastApiServerInfo
+from app.services.rar_hash import parse_rar5_hash
+
+RATE_KEY = "estimator:rate:{kind}"
+# Вес нового измерения в скользящем среднем
+RATE_SMOOTHING = 0.3
+
+
+def verifier_kind(hash_value):
+    """
+    Способ проверки паролей для хеша: от него зависит скорость перебора.
+    """
+    verifier = parse_rar5_hash(hash_value)
+    if verifier:
+        return f"rar5:{verifier.iterations}"
+    return "extract"
+
+
+async def get_rate(redis_client, kind):
+    """
+    Измеренная скорость одного процесса (паролей в секунду) или значение по умолчанию.
+    """
+    value = await redis_client.get(RATE_KEY.format(kind=kind))
+    return float(value) if value else FastApiServerInfo.DEFAULT_GUESS_RATE
+
+
+async def record_rate(redis_client, kind, rate):
+    if rate <= 0:
+        return
+    key = RATE_KEY.format(kind=kind)
+    old = await redis_client.get(key)
+    if old:
+        rate = float(old) * (1 - RATE_SMOOTHING) + rate * RATE_SMOOTHING
+    await redis_client.set(key, rate)
+
+
+async def estimate(redis_client, hash_value, total_passwords, parallelism):
+    """
+    Оценка задачи: число паролей, скорость и ожидаемая длительность в секундах.
+    hash_value может быть неизвестен, если архив ещё не обрабатывался.
+    """
+    kind = verifier_kind(hash_value) if hash_value else "extract"
+    rate = await get_rate(redis_client, kind)
+    seconds = total_passwords / (rate * max(parallelism, 1))
+    return {
+        "total": total_passwords,
+        "rate_per_process": round(rate, 1),
+        "parallelism": parallelism,
+        "seconds": round(seconds, 1),
+    }
@@ -0,0 +1,171 @@
+"""
+Перебор в порядке вероятности по марковской модели (режим markov).
+
+Статистика собирается по словарю (по умолчанию Johntheripper/run/password.lst):
+частоты длин паролей и частоты символа в зависимости от позиции и предыдущего символа.
+Для каждой пары (позиция, предыдущий символ) символы набора сортируются по убыванию
+частоты, так что кандидат задаётся кортежем рангов: ранг 0 - самый частый символ
+после предыдущего. Стоимость кандидата - сумма его рангов плюс место его длины
+в списке длин, отсортированном по частоте. Кандидаты перебираются по возрастанию
+стоимости (сначала самые вероятные), при равной стоимости - по частоте длины,
+затем в лексикографическом порядке рангов.
+Число кортежей с заданной длиной и суммой рангов считается заранее, поэтому индекс
+переводится в пароль за O(длина * threshold) плюс двоичный поиск блока: пространство
+делится на шарды и продолжается с контрольной точки, как и остальные режимы.
+
+threshold ограничивает число рассматриваемых символов на позицию (как -t в Hashcat):
+пространство сокращается до threshold ** длина, но уже не является полным перебором.
+Имена файлов John the Ripper *.chr можно использовать как готовые наборы символов
+(digits.chr, lower.chr, alnum.chr, ...); сами файлы инкрементального режима John
+не разбираются - порядок задаётся статистикой словаря.
+"""
+import string
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.endpoints import FastApiServerInfo
+from app.services.keyspace import normalize_charset
+from app.services.wordlist import load_words, wordlist_path
+
+CHR_CHARSETS = {
+    "digits.chr": string.digits,
+    "lower.chr": string.ascii_lowercase,
+    "upper.chr": string.ascii_uppercase,
+    "alpha.chr": string.ascii_lowercase + string.ascii_uppercase,
+    "lowernum.chr": string.ascii_lowercase + string.digits,
+    "uppernum.chr": string.ascii_uppercase + string.digits,
+    "alnum.chr": string.ascii_lowercase + string.ascii_uppercase + string.digits,
+    "lowerspace.chr": string.ascii_lowercase + " ",
+    "alnumspace.chr": string.ascii_lowercase + string.ascii_uppercase + string.digits + " ",
+}
+
+# Позиции начиная с этой используют общую статистику: длинных паролей в словаре мало
+POSITION_LIMIT = 8
+
+
+def resolve_charset(charset: str) -> str:
+    """
+    Набор символов: имя файла *.chr John the Ripper или сами символы.
+    """
+    return CHR_CHARSETS.get(charset, normalize_charset(charset or ""))
+
+
+class MarkovStats:
+    def __init__(self, words: List[str], charset: str):
+        self.charset = charset
+        allowed = set(charset)
+        self.lengths = Counter(len(word) for word in words)
+        self._unigram = Counter()
+        self._positional = defaultdict(Counter)
+        self._bigram = defaultdict(Counter)
+        for word in words:
+            previous = ""
+            for position, char in enumerate(word):
+                if char in allowed:
+                    position = min(position, POSITION_LIMIT - 1)
+                    self._unigram[char] += 1
+                    self._positional[position][char] += 1
+                    self._bigram[(position, previous)][char] += 1
+                previous = char if char in allowed else ""
+        self._orders: Dict[Tuple[int, str], str] = {}
+
+    def order(self, position: int, previous: str) -> str:
+        """
+        Символы набора по убыванию вероятности после previous на позиции position.
+        Невстреченные сочетания упорядочиваются по частоте на позиции, затем по общей частоте.
+        """
+        key = (min(position, POSITION_LIMIT - 1), previous)
+        order = self._orders.get(key)
+        if order is None:
+            bigram = self._bigram.get(key, Counter())
+            positional = self._positional.get(key[0], Counter())
+            order = "".join(sorted(
+                self.charset,
+                key=lambda char: (-bigram[char], -positional[char], -self._unigram[char])
+            ))
+            self._orders[key] = order
+        return order
+
+
+class MarkovSpace:
+    def __init__(self, stats: MarkovStats, min_length: int, max_length: int, threshold: Optional[int] = None):
+        self.stats = stats
+        self.base = min(threshold or len(stats.charset), len(stats.charset))
+        self.lengths = sorted(range(max(1, min_length), max_length + 1), key=lambda length: (-stats.lengths[length], length))
+        # tuples[n][s] - число кортежей из n рангов [0, base) с суммой s
+        tuples = [[1]]
+        for n in range(1, max_length + 1):
+            previous = tuples[-1]
+            row = [0] * (n * (self.base - 1) + 1)
+            for s in range(len(row)):
+                row[s] = sum(previous[s - d] for d in range(min(self.base - 1, s) + 1) if s - d < len(previous))
+            tuples.append(row)
+        self._tuples = tuples
+        # Блоки кандидатов одной длины и одной суммы рангов в порядке перебора:
+        # (стоимость, место длины) -> начальный индекс блока
+        if self.base == 0:
+            self.lengths = []
+        blocks = sorted(
+            (slot + level, slot, length, level)
+            for slot, length in enumerate(self.lengths)
+            for level in range(len(tuples[length]))
+        )
+        self._block_starts: List[int] = []
+        self._blocks: List[Tuple[int, int]] = []
+        self.size = 0
+        for _, _, length, level in blocks:
+            self._block_starts.append(self.size)
+            self._blocks.append((length, level))
+            self.size += tuples[length][level]
+
+    def _ranks(self, length: int, level: int, index: int) -> List[int]:
+        ranks = []
+        for position in range(length):
+            rest = length - position - 1
+            rest_tuples = self._tuples[rest]
+            # Младшие ранги, при которых остаток не может набрать нужную сумму, пропускаем сразу
+            for rank in range(max(0, level - rest * (self.base - 1)), min(self.base - 1, level) + 1):
+                count = rest_tuples[level - rank]
+                if index < count:
+                    break
+                index -= count
+            ranks.append(rank)
+            level -= rank
+        return ranks
+
+    def index_to_password(self, index: int) -> str:
+        if not 0 <= index < self.size:
+            raise IndexError("Индекс выходит за пределы пространства")
+        block = bisect_right(self._block_starts, index) - 1
+        length, level = self._blocks[block]
+        chars, previous = [], ""
+        for position, rank in enumerate(self._ranks(length, level, index - self._block_starts[block])):
+            previous = self.stats.order(position, previous)[rank]
+            chars.append(previous)
+        return "".join(chars)
+
+    def iter(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Optional[str]]:
+        stop = self.size if stop is None else min(stop, self.size)
+        for index in range(start, stop):
+            yield self.index_to_password(index)
+
+
+@lru_cache(maxsize=16)
+def _stats(wordlist: str, charset: str) -> MarkovStats:
+    return MarkovStats(load_words(wordlist_path(wordlist)), charset)
+
+
+def make_markov_space(charset: str, max_length: int, min_length: int = 1, threshold: Optional[int] = None, wordlist: str = "password.lst") -> MarkovSpace:
+    """
+    Статистика словаря собирается один раз на процесс для каждого набора символов.
+    """
+    charset = resolve_charset(charset)
+    if not charset or max_length < 1:
+        raise ValueError("Для режима markov нужны непустой charset и max_length >= 1")
+    if max_length > FastApiServerInfo.MAX_MARKOV_LENGTH:
+        raise ValueError(f"Для режима markov max_length должно быть не больше {FastApiServerInfo.MAX_MARKOV_LENGTH}")
+    if threshold is not None and threshold < 1:
+        raise ValueError("threshold должен быть не меньше 1")
+    return MarkovSpace(_stats(wordlist, charset), min_length, max_length, threshold)
@@ -0,0 +1,152 @@
+"""
+Перебор по маске в синтаксисе Hashcat (режим mask).
+
+Маска задаёт набор символов для каждой позиции пароля:
+    ?l - строчные латинские буквы     ?u - заглавные        ?d - цифры
+    ?s - спецсимволы и пробел         ?a - ?l?u?d?s         ?h / ?H - шестнадцатеричные цифры
+    ?b - все байты 0x00-0xff          ?1..?4 - пользовательские наборы    ?? - сам символ "?"
+Любой другой символ - фиксированный литерал. Например, "Admin?d?d?d" или "?u?l?l?l?d?d".
+Пользовательские наборы тоже могут ссылаться на встроенные: "?l?d_".
+
+Пространство маски - число в смешанной системе счисления: основание каждой позиции -
+размер её набора, последняя позиция меняется быстрее всех. Индекс переводится в пароль
+за O(длины маски), поэтому маска делится на шарды и продолжается с контрольной точки.
+
+С increment (как --increment в Hashcat) перебираются все префиксы маски длиной
+от increment_min до increment_max: "?d?d?d" даёт сначала 10 паролей из одной цифры,
+затем 100 из двух и 1000 из трёх. Такое пространство - подряд идущие пространства
+префиксов; индекс переводится в пароль двоичным поиском префикса по смещениям.
+"""
+import string
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Sequence
+
+from app.services.keyspace import normalize_charset
+
+BUILTIN_CHARSETS = {
+    "l": string.ascii_lowercase,
+    "u": string.ascii_uppercase,
+    "d": string.digits,
+    "s": " " + string.punctuation,
+    "h": string.digits + "abcdef",
+    "H": string.digits + "ABCDEF",
+    "b": "".join(chr(code) for code in range(256)),
+}
+BUILTIN_CHARSETS["a"] = BUILTIN_CHARSETS["l"] + BUILTIN_CHARSETS["u"] + BUILTIN_CHARSETS["d"] + BUILTIN_CHARSETS["s"]
+
+MAX_CUSTOM_CHARSETS = 4
+
+
+def _expand(text: str, custom: Sequence[str], allow_custom: bool) -> List[str]:
+    """
+    Разбирает текст маски в список наборов символов - по одному на позицию.
+    """
+    positions = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char != "?":
+            positions.append(char)
+            i += 1
+            continue
+        if i + 1 >= len(text):
+            raise ValueError("Маска заканчивается одиночным '?'")
+        name = text[i + 1]
+        i += 2
+        if name == "?":
+            positions.append("?")
+        elif name in BUILTIN_CHARSETS:
+            positions.append(BUILTIN_CHARSETS[name])
+        elif allow_custom and name in "1234":
+            number = int(name)
+            if number > len(custom) or not custom[number - 1]:
+                raise ValueError(f"Пользовательский набор ?{number} не задан")
+            positions.append(custom[number - 1])
+        else:
+            raise ValueError(f"Неизвестный набор ?{name}")
+    return positions
+
+
+def parse_mask(mask: str, custom_charsets: Sequence[str] = ()) -> List[str]:
+    """
+    Возвращает наборы символов позиций маски. ValueError - некорректная маска.
+    """
+    if not mask:
+        raise ValueError("Пустая маска")
+    if len(custom_charsets) > MAX_CUSTOM_CHARSETS:
+        raise ValueError(f"Не больше {MAX_CUSTOM_CHARSETS} пользовательских наборов")
+    # Пользовательский набор - это объединение символов, а не позиции
+    custom = [normalize_charset("".join(_expand(charset or "", (), allow_custom=False))) for charset in custom_charsets]
+    return [normalize_charset(charset) for charset in _expand(mask, custom, allow_custom=True)]
+
+
+class MaskSpace:
+    def __init__(self, mask: str, custom_charsets: Sequence[str] = (), increment: bool = False,
+                 increment_min: int = 1, increment_max: Optional[int] = None):
+        self.mask = mask
+        self.positions = parse_mask(mask, custom_charsets)
+        self.bases = [len(charset) for charset in self.positions]
+        if increment:
+            increment_max = len(self.positions) if increment_max is None else increment_max
+            if not 1 <= increment_min <= increment_max <= len(self.positions):
+                raise ValueError(f"Границы increment должны удовлетворять 1 <= min <= max <= {len(self.positions)}")
+            self.lengths = list(range(increment_min, increment_max + 1))
+        else:
+            self.lengths = [len(self.positions)]
+        # Пространство с increment - подряд идущие пространства префиксов маски,
+        # offsets[i] - индекс первого кандидата длины lengths[i]
+        self.offsets = []
+        self.size = 0
+        for length in self.lengths:
+            self.offsets.append(self.size)
+            segment = 1
+            for base in self.bases[:length]:
+                segment *= base
+            self.size += segment
+
+    def _segment(self, index: int) -> int:
+        return bisect_right(self.offsets, index) - 1
+
+    def index_to_password(self, index: int) -> str:
+        if not 0 <= index < self.size:
+            raise IndexError("Индекс выходит за пределы пространства маски")
+        segment = self._segment(index)
+        length = self.lengths[segment]
+        digits = self._digits(index - self.offsets[segment], length)
+        return "".join(charset[digit] for charset, digit in zip(self.positions, digits))
+
+    def _digits(self, index: int, length: int) -> List[int]:
+        digits = [0] * length
+        for pos in range(length - 1, -1, -1):
+            index, digits[pos] = divmod(index, self.bases[pos])
+        return digits
+
+    def iter(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Optional[str]]:
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return
+        segment = self._segment(start)
+        while start < stop:
+            length = self.lengths[segment]
+            segment_stop = self.offsets[segment + 1] if segment + 1 < len(self.offsets) else self.size
+            count = min(stop, segment_stop) - start
+            yield from self._odometer(length, start - self.offsets[segment], count)
+            start += count
+            segment += 1
+
+    def _odometer(self, length: int, index: int, count: int) -> Iterator[str]:
+        digits = self._digits(index, length)
+        chars = [charset[digit] for charset, digit in zip(self.positions, digits)]
+        last = length - 1
+        for _ in range(count):
+            yield "".join(chars)
+            # Одометр в смешанной системе счисления
+            pos = last
+            while pos >= 0:
+                digits[pos] += 1
+                if digits[pos] < self.bases[pos]:
+                    chars[pos] = self.positions[pos][digits[pos]]
+                    break
+                digits[pos] = 0
+                chars[pos] = self.positions[pos][0]
+                pos -= 1
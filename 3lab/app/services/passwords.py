@@ -0,0 +1,51 @@
+"""
+Хеширование паролей пользователей (bcrypt через passlib).
+
+bcrypt намеренно медленный, поэтому хеширование и проверка выполняются в отдельном
+ограниченном пуле потоков: bcrypt отпускает GIL, цикл событий uvicorn продолжает
+обслуживать остальные запросы, а всплеск входов не занимает больше max_workers ядер.
+Пароли, сохранённые до перехода на хеши открытым текстом, принимаются при входе
+и сразу перехешируются, так же как хеши с устаревшим числом раундов.
+"""
+import asyncio
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.endpoints import FastApiServerInfo
+
+# min_rounds: хеши с меньшей стоимостью verify_and_update помечает для перехеширования
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__rounds=FastApiServerInfo.BCRYPT_ROUNDS, bcrypt__min_rounds=FastApiServerInfo.BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=FastApiServerInfo.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def _verify_and_update(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if stored is None:
+        # Пользователь не найден: тратим столько же времени, сколько на проверку,
+        # чтобы по времени ответа нельзя было перебирать email
+        pwd_context.dummy_verify()
+        return False, None
+    if pwd_context.identify(stored) is None:
+        # Старая запись с паролем открытым текстом
+        if secrets.compare_digest(password.encode(), stored.encode()):
+            return True, pwd_context.hash(password)
+        return False, None
+    return pwd_context.verify_and_update(password, stored)
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, pwd_context.hash, password)
+
+
+async def verify_password(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль по сохранённому значению. Возвращает (совпал, новый_хеш);
+    новый хеш не None, если запись нужно обновить (открытый текст или устаревшие раунды).
+    """
+    return await asyncio.get_running_loop().run_in_executor(_executor, _verify_and_update, password, stored)
@@ -0,0 +1,113 @@
+"""
+Пакетная публикация прогресса перебора в канал уведомлений задачи.
+
+Вместо сообщения на каждый проверенный пароль ProgressReporter копит счётчик
+и отправляет одно сообщение не чаще чем раз в interval секунд или раз в batch
+паролей. В сообщение добавляются скорость перебора и оценка оставшегося времени.
+Вместе с прогрессом сохраняется контрольная точка - индекс, до которого все пароли
+уже проверены, чтобы после перезапуска воркера продолжить с этого места.
+Корутина keepalive вызывается не чаще раза в keepalive_interval секунд и продлевает
+ресурсы задачи, которые иначе истекли бы во время долгого перебора.
+"""
+import json
+import time
+
+
+class ProgressReporter:
+    def __init__(self, redis_client, task_id, total, counter_key, stop_keys, ttl, interval=1.0, batch=1000, channel="notifications", checkpoint_key=None, checkpoint_field=None, keepalive=None, keepalive_interval=60.0):
+        self.redis_client = redis_client
+        self.task_id = task_id
+        self.total = total
+        # Общий для всех шардов счётчик проверенных паролей и флаги остановки
+        # (пароль найден другим шардом или задача отменена)
+        self.counter_key = counter_key
+        self.stop_keys = stop_keys
+        self.ttl = ttl
+        self.interval = interval
+        self.batch = batch
+        self.channel = channel
+        # Контрольные точки хранятся в hash Redis: поле - начало диапазона шарда
+        self.checkpoint_key = checkpoint_key
+        self.checkpoint_field = checkpoint_field
+        self.position = None
+        self.keepalive = keepalive
+        self.keepalive_interval = keepalive_interval
+
+        self.pending = 0
+        # Сколько кандидатов этот шард действительно проверил
+        # (без отброшенных правилами и уже перебранных)
+        self.verified = 0
+        self.processed = None
+        self.should_stop = False
+        self._started_at = time.monotonic()
+        self._last_flush = self._started_at
+        self._processed_at_start = None
+        self._last_keepalive = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Остаток прогресса отправляется всегда: и при успехе, и при ошибке
+        if self.pending or self.processed is None:
+            await self.flush()
+        return False
+
+    async def advance(self, checked=1, position=None, verified=None):
+        """
+        Учитывает checked проверенных паролей и при необходимости публикует прогресс.
+        position - индекс, до которого (не включая) все пароли проверены;
+        verified - сколько из них передано в проверку (по умолчанию все).
+        Возвращает True, если перебор нужно прекратить.
+        """
+        self.pending += checked
+        self.verified += checked if verified is None else verified
+        if position is not None:
+            self.position = position
+        if self.pending >= self.batch or time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+        return self.should_stop
+
+    async def flush(self):
+        """
+        Публикует накопленный прогресс. Возвращает True, если перебор нужно прекратить.
+        """
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.incrby(self.counter_key, self.pending)
+            pipe.expire(self.counter_key, self.ttl)
+            pipe.exists(*self.stop_keys)
+            if self.checkpoint_key and self.position is not None:
+                pipe.hset(self.checkpoint_key, self.checkpoint_field, self.position)
+                pipe.expire(self.checkpoint_key, self.ttl)
+            self.processed, _, stop_flags, *_ = await pipe.execute()
+        if self._processed_at_start is None:
+            # Прогресс других шардов до нашего старта в скорость не входит
+            self._processed_at_start = self.processed - self.pending
+        self.pending = 0
+        self.should_stop = bool(stop_flags)
+
+        now = time.monotonic()
+        self._last_flush = now
+        if self.keepalive and (self._last_keepalive is None or now - self._last_keepalive >= self.keepalive_interval):
+            self._last_keepalive = now
+            await self.keepalive()
+        elapsed = now - self._started_at
+        # Скорость общая для всех шардов, так как счётчик общий
+        rate = (self.processed - self._processed_at_start) / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.processed, 0)
+        eta = remaining / rate if rate > 0 else None
+
+        progress = (self.processed / self.total) * 100 if self.total > 0 else 0
+        await self.redis_client.publish(self.channel, json.dumps({
+            "task_id": self.task_id,
+            "status": "progress",
+            "progress": int(progress),
+            "processed": self.processed,
+            "total": self.total,
+            "rate": round(rate, 1),
+            "eta": round(eta) if eta is not None else None,
+            "detail": f"Проверено {self.processed}/{self.total} паролей",
+            # Время публикации: по нему API считает задержку доставки уведомлений
+            "ts": time.time(),
+        }))
+        return self.should_stop
@@ -0,0 +1,59 @@
+"""
+Проверка паролей по хешу RAR5 без распаковки архива.
+
+Строка хеша имеет формат rar2john:
+    $rar5$<длина соли>$<соль>$<log2 числа итераций>$<iv>$<длина проверки>$<значение проверки>
+Значение проверки пароля в RAR5 получается из PBKDF2-HMAC-SHA256 с числом итераций
+2**lg2count + 32, 32 байта которого сворачиваются операцией XOR до 8 байт.
+"""
+import hashlib
+import hmac
+import re
+
+RAR5_HASH_RE = re.compile(
+    r"\$rar5\$(\d+)\$([0-9a-f]+)\$(\d+)\$([0-9a-f]+)\$(\d+)\$([0-9a-f]+)",
+    re.IGNORECASE,
+)
+# Дополнительные итерации PBKDF2 для значения проверки пароля (PswCheck)
+PSWCHECK_EXTRA_ITERATIONS = 32
+PSWCHECK_SIZE = 8
+
+
+class Rar5Verifier:
+    """
+    Проверяет пароль по соли и значению проверки из хеша RAR5.
+    Экземпляр вызывается как функция: verifier(password) -> bool.
+    """
+
+    def __init__(self, salt, lg2count, pswcheck):
+        self.salt = salt
+        self.iterations = (1 << lg2count) + PSWCHECK_EXTRA_ITERATIONS
+        self.pswcheck = pswcheck
+
+    def __call__(self, password):
+        value = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), self.salt, self.iterations)
+        check = bytearray(PSWCHECK_SIZE)
+        for i, byte in enumerate(value):
+            check[i % PSWCHECK_SIZE] ^= byte
+        return hmac.compare_digest(bytes(check), self.pswcheck)
+
+
+def parse_rar5_hash(hash_line):
+    """
+    Разбирает строку хеша rar2john. Возвращает Rar5Verifier или None,
+    если строка не является корректным хешем RAR5.
+    """
+    if not hash_line:
+        return None
+    match = RAR5_HASH_RE.search(hash_line)
+    if not match:
+        return None
+    salt_len, salt_hex, lg2count, _iv_hex, check_len, check_hex = match.groups()
+    salt = bytes.fromhex(salt_hex)
+    pswcheck = bytes.fromhex(check_hex)
+    if len(salt) != int(salt_len) or len(pswcheck) != int(check_len) or len(pswcheck) != PSWCHECK_SIZE:
+        return None
+    # Число итераций в RAR5 ограничено 2**24
+    if int(lg2count) > 24:
+        return None
+    return Rar5Verifier(salt, int(lg2count), pswcheck)
@@ -0,0 +1,223 @@
+"""
+Движок правил мутации паролей в формате Hashcat/John (файлы Johntheripper/run/rules/*.rule).
+
+Правило - строка из функций, каждая из которых задаётся символом и фиксированным числом
+аргументов: "c $1 $2" - сделать первую букву заглавной и дописать "12".
+Позиции кодируются символами 0-9 и A-Z (10-35). Пробелы между функциями игнорируются.
+Правило компилируется один раз в список функций и затем применяется к каждому слову;
+функции отбора (<N, !X, ...) отбрасывают слово - тогда правило возвращает None.
+Функции работы с памятью (M, 4, 6, X, Q) не поддерживаются: такие правила пропускаются.
+"""
+from typing import Callable, List, Optional
+
+
+class RuleError(ValueError):
+    """
+    Правило содержит неизвестную или неподдерживаемую функцию.
+    """
+
+
+def _position(char: str) -> int:
+    if "0" <= char <= "9":
+        return ord(char) - ord("0")
+    if "A" <= char <= "Z":
+        return ord(char) - ord("A") + 10
+    raise RuleError(f"Некорректная позиция {char!r}")
+
+
+def _title(word: str, separator: str) -> str:
+    chars = list(word.lower())
+    upper_next = True
+    for i, char in enumerate(chars):
+        if upper_next:
+            chars[i] = char.upper()
+        upper_next = char == separator
+    return "".join(chars)
+
+
+def _at(word: str, n: int, transform: Callable[[str], str]) -> str:
+    if n >= len(word):
+        return word
+    return word[:n] + transform(word[n]) + word[n + 1:]
+
+
+def _shift(char: str, delta: int) -> str:
+    return chr((ord(char) + delta) & 0xFF)
+
+
+# Функции без аргументов
+_SIMPLE = {
+    ":": lambda w: w,
+    "l": str.lower,
+    "u": str.upper,
+    "c": lambda w: w[:1].upper() + w[1:].lower(),
+    "C": lambda w: w[:1].lower() + w[1:].upper(),
+    "t": str.swapcase,
+    "r": lambda w: w[::-1],
+    "d": lambda w: w + w,
+    "f": lambda w: w + w[::-1],
+    "{": lambda w: w[1:] + w[:1],
+    "}": lambda w: w[-1:] + w[:-1],
+    "[": lambda w: w[1:],
+    "]": lambda w: w[:-1],
+    "q": lambda w: "".join(c + c for c in w),
+    "k": lambda w: w[1:2] + w[:1] + w[2:] if len(w) > 1 else w,
+    "K": lambda w: w[:-2] + w[-1] + w[-2] if len(w) > 1 else w,
+    "E": lambda w: _title(w, " "),
+}
+
+# Функции с одной позицией N
+_POSITIONAL = {
+    "T": lambda w, n: _at(w, n, str.swapcase),
+    "D": lambda w, n: w[:n] + w[n + 1:],
+    "'": lambda w, n: w[:n],
+    "p": lambda w, n: w * (n + 1),
+    "z": lambda w, n: w[:1] * n + w,
+    "Z": lambda w, n: w + w[-1:] * n,
+    "L": lambda w, n: _at(w, n, lambda c: chr((ord(c) << 1) & 0xFF)),
+    "R": lambda w, n: _at(w, n, lambda c: chr(ord(c) >> 1)),
+    "+": lambda w, n: _at(w, n, lambda c: _shift(c, 1)),
+    "-": lambda w, n: _at(w, n, lambda c: _shift(c, -1)),
+    ".": lambda w, n: w[:n] + w[n + 1] + w[n + 1:] if n + 1 < len(w) else w,
+    ",": lambda w, n: w[:n] + w[n - 1] + w[n + 1:] if 0 < n < len(w) else w,
+    "y": lambda w, n: w[:n] + w if n <= len(w) else w,
+    "Y": lambda w, n: w + w[len(w) - n:] if 0 < n <= len(w) else w,
+}
+
+# Функции с одним символом X
+_CHARACTER = {
+    "$": lambda w, x: w + x,
+    "^": lambda w, x: x + w,
+    "@": lambda w, x: w.replace(x, ""),
+    "e": lambda w, x: _title(w, x),
+}
+
+# Функции с позицией N и вторым аргументом (позиция M или символ X)
+_TWO_POSITIONS = {
+    "x": lambda w, n, m: w[n:n + m] if n < len(w) else w,
+    "O": lambda w, n, m: w[:n] + w[n + m:] if n < len(w) else w,
+    "*": lambda w, n, m: _swap(w, n, m),
+}
+_POSITION_AND_CHARACTER = {
+    "i": lambda w, n, x: w[:n] + x + w[n:] if n <= len(w) else w,
+    "o": lambda w, n, x: w[:n] + x + w[n + 1:] if n < len(w) else w,
+}
+
+# Функции отбора: True - слово остаётся
+_REJECT_POSITIONAL = {
+    "<": lambda w, n: len(w) < n,
+    ">": lambda w, n: len(w) > n,
+    "_": lambda w, n: len(w) == n,
+}
+_REJECT_CHARACTER = {
+    "!": lambda w, x: x not in w,
+    "/": lambda w, x: x in w,
+    "(": lambda w, x: w[:1] == x,
+    ")": lambda w, x: w[-1:] == x,
+}
+_REJECT_POSITION_AND_CHARACTER = {
+    "=": lambda w, n, x: n < len(w) and w[n] == x,
+    "%": lambda w, n, x: w.count(x) >= n,
+}
+
+
+def _swap(word: str, n: int, m: int) -> str:
+    if n >= len(word) or m >= len(word):
+        return word
+    chars = list(word)
+    chars[n], chars[m] = chars[m], chars[n]
+    return "".join(chars)
+
+
+def _bind(fn, *args):
+    return lambda w: fn(w, *args)
+
+
+def _reject(test, *args):
+    return lambda w: w if test(w, *args) else None
+
+
+def compile_rule(rule: str) -> Callable[[str], Optional[str]]:
+    """
+    Компилирует правило в функцию word -> кандидат (или None, если слово отброшено).
+    """
+    steps: List[Callable[[str], Optional[str]]] = []
+    i = 0
+
+    def argument(count):
+        nonlocal i
+        if i + count > len(rule):
+            raise RuleError(f"Не хватает аргументов у функции {rule[i - 1]!r}")
+        value = rule[i:i + count]
+        i += count
+        return value
+
+    while i < len(rule):
+        op = rule[i]
+        i += 1
+        if op in " \t":
+            continue
+        if op in _SIMPLE:
+            steps.append(_SIMPLE[op])
+        elif op in _POSITIONAL:
+            steps.append(_bind(_POSITIONAL[op], _position(argument(1))))
+        elif op in _CHARACTER:
+            steps.append(_bind(_CHARACTER[op], argument(1)))
+        elif op == "s":
+            old, new = argument(2)
+            steps.append(_bind(str.replace, old, new))
+        elif op in _TWO_POSITIONS:
+            n, m = argument(2)
+            steps.append(_bind(_TWO_POSITIONS[op], _position(n), _position(m)))
+        elif op in _POSITION_AND_CHARACTER:
+            n, x = argument(2)
+            steps.append(_bind(_POSITION_AND_CHARACTER[op], _position(n), x))
+        elif op in _REJECT_POSITIONAL:
+            steps.append(_reject(_REJECT_POSITIONAL[op], _position(argument(1))))
+        elif op in _REJECT_CHARACTER:
+            steps.append(_reject(_REJECT_CHARACTER[op], argument(1)))
+        elif op in _REJECT_POSITION_AND_CHARACTER:
+            n, x = argument(2)
+            steps.append(_reject(_REJECT_POSITION_AND_CHARACTER[op], _position(n), x))
+        else:
+            raise RuleError(f"Неподдерживаемая функция {op!r} в правиле {rule!r}")
+
+    if not steps:
+        return _SIMPLE[":"]
+    if len(steps) == 1:
+        return steps[0]
+
+    def apply(word):
+        for step in steps:
+            word = step(word)
+            if word is None:
+                return None
+        return word
+
+    return apply
+
+
+def load_rules(paths) -> List[Callable[[str], Optional[str]]]:
+    """
+    Читает и компилирует правила из файлов. Комментарии, пустые строки, повторы
+    и неподдерживаемые правила пропускаются. Первым всегда идёт правило ":" -
+    слова словаря проверяются без изменений раньше всех мутаций.
+    """
+    seen = {":"}
+    rules = [_SIMPLE[":"]]
+    for path in paths:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if not line.strip() or line.startswith("#"):
+                    continue
+                # Одно и то же правило с разными пробелами между функциями - повтор
+                key = line.strip()
+                if key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    rules.append(compile_rule(line))
+                except RuleError:
+                    continue
+    return rules
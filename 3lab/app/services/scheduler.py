@@ -0,0 +1,92 @@
+"""
+Справедливый допуск задач перебора с квотой на пользователя.
+
+У каждого пользователя не больше USER_MAX_ACTIVE_JOBS одновременно запущенных
+задач. Сверх квоты задача ставится в личную очередь пользователя и запускается,
+когда освобождается одна из его же задач. Так один пользователь с длинными задачами
+не занимает все воркеры, а остальные получают свои слоты без ожидания.
+Проверка квоты и постановка в очередь выполняются атомарно скриптами Lua.
+Ключи квоты и очереди (и описания ожидающих задач) живут JOB_RECOVERY_TTL и продлеваются
+выполняющимися задачами пользователя (touch), поэтому не истекают посреди долгой задачи.
+"""
+import json
+
+from app.core.endpoints import FastApiServerInfo
+
+# KEYS[1] - счётчик активных задач, KEYS[2] - очередь ожидающих
+# ARGV[1] - квота, ARGV[2] - описание задачи, ARGV[3] - TTL
+ADMIT_SCRIPT = """
+local active = tonumber(redis.call('GET', KEYS[1]) or '0')
+if active < tonumber(ARGV[1]) then
+    redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+end
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 0
+"""
+
+# KEYS[1] - счётчик активных задач, KEYS[2] - очередь ожидающих, ARGV[1] - TTL
+# Возвращает описания ожидающих задач, чтобы продлить и их состояние и архивы
+TOUCH_SCRIPT = """
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return redis.call('LRANGE', KEYS[2], 0, -1)
+"""
+
+# Освободившийся слот сразу передаётся следующей задаче пользователя, если она есть
+RELEASE_SCRIPT = """
+local next_job = redis.call('LPOP', KEYS[2])
+if next_job then
+    return next_job
+end
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    redis.call('DECR', KEYS[1])
+end
+return false
+"""
+
+
+def _keys(user_id):
+    return [f"sched:user:{user_id}:active", f"sched:user:{user_id}:pending"]
+
+
+async def admit(redis_client, user_id, job_payload, quota=FastApiServerInfo.USER_MAX_ACTIVE_JOBS):
+    """
+    Занимает слот пользователя. Возвращает True, если задачу можно запускать сразу;
+    иначе job_payload (строка JSON) ставится в очередь пользователя.
+    """
+    script = redis_client.register_script(ADMIT_SCRIPT)
+    admitted = await script(keys=_keys(user_id), args=[quota, job_payload, FastApiServerInfo.JOB_RECOVERY_TTL])
+    return bool(admitted)
+
+
+async def release(redis_client, user_id):
+    """
+    Освобождает слот пользователя. Возвращает описание следующей задачи из его очереди,
+    которой передан слот, или None.
+    """
+    script = redis_client.register_script(RELEASE_SCRIPT)
+    return await script(keys=_keys(user_id), args=[])
+
+
+async def touch(redis_client, user_id, meta_key, ttl=FastApiServerInfo.JOB_RECOVERY_TTL):
+    """
+    Продлевает квоту и очередь пользователя и описания ожидающих в ней задач;
+    meta_key(job_id) - ключ описания задачи. Возвращает blob_id ожидающих задач.
+    """
+    script = redis_client.register_script(TOUCH_SCRIPT)
+    pending = [json.loads(payload) for payload in await script(keys=_keys(user_id), args=[ttl])]
+    for job in pending:
+        await redis_client.expire(meta_key(job["job_id"]), ttl)
+    return [job["blob_id"] for job in pending]
+
+
+def queue_for(expected_seconds):
+    """
+    Очередь Celery по ожидаемой длительности задачи: короткие задачи не ждут длинных.
+    """
+    if expected_seconds <= FastApiServerInfo.INTERACTIVE_JOB_SECONDS:
+        return FastApiServerInfo.SHORT_QUEUE
+    return FastApiServerInfo.LONG_QUEUE
@@ -0,0 +1,63 @@
+"""
+Кеш "токен -> пользователь" перед запросом к таблице Users.
+
+Клиент опрашивает защищённые эндпоинты часто, а токен пользователя меняется редко,
+поэтому найденный пользователь запоминается в памяти процесса. Размер кеша ограничен
+(вытесняется давно не использованный токен), а записи живут не дольше ttl секунд,
+так что изменения в БД, сделанные другой репликой API, рано или поздно будут замечены.
+При входе и регистрации записи пользователя сбрасываются явно.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+
+class TokenCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # token -> (пользователь, момент устаревания); порядок - от давно использованных к недавним
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Токены каждого пользователя для сброса по user_id
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.invalidate_token(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: dict) -> None:
+        self.invalidate_token(token)
+        self._entries[token] = (user, time.monotonic() + self.ttl)
+        self._tokens_by_user.setdefault(user["id"], set()).add(token)
+        while len(self._entries) > self.maxsize:
+            self.invalidate_token(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[0]["id"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0]["id"]]
+
+    def invalidate_user(self, user_id: int) -> None:
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self.invalidate_token(token)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tokens_by_user.clear()
@@ -0,0 +1,165 @@
+"""
+Пул процессов для проверки паролей внутри одной задачи перебора.
+
+Каждый процесс пула один раз готовит свою функцию проверки (хеш RAR5 в памяти или
+собственный экземпляр rarfile.RarFile) и проверяет пачки кандидатов из непрерывных
+диапазонов индексов. Кандидаты выдаёт родительский процесс одним итератором
+пространства, как при переборе в одном процессе: отсев повторов в режиме словаря
+работает на всём диапазоне, а не заново в каждой пачке. Родительский процесс
+собирает прогресс и останавливает пул, как только пароль найден.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import rarfile
+
+from app.services.candidates import make_space
+from app.services.crack_cache import make_exhausted_filter
+from app.services.rar_hash import parse_rar5_hash
+
+logger = logging.getLogger(__name__)
+
+# Состояние процесса пула, заполняется в _init_worker
+_checker = None
+_already_checked = None
+_stop_event = None
+
+
+def check_password(rf, password, extraction_dir):
+    """
+    Пробует распаковать архив с паролем. Возвращает True, если пароль подошёл.
+    """
+    try:
+        rf.extractall(path=extraction_dir, pwd=password.encode())
+        return True
+    except (rarfile.BadRarFile, rarfile.RarCRCError):
+        return False
+
+
+def make_checker(archive_path, extraction_dir, hash_value=None):
+    """
+    Возвращает функцию checker(password) -> bool.
+    Для RAR5 пароль проверяется по хешу в памяти, без unrar и записи на диск;
+    для остальных форматов - пробной распаковкой архива.
+    """
+    verifier = parse_rar5_hash(hash_value)
+    if verifier:
+        return verifier
+    rf = rarfile.RarFile(archive_path)
+    return lambda password: check_password(rf, password, extraction_dir)
+
+
+def pool_available():
+    """
+    Можно ли запустить пул из текущего процесса. Дочерние процессы prefork-пула Celery
+    (billiard) - демоны, а демон не может порождать процессы.
+    """
+    if multiprocessing.current_process().daemon:
+        return False
+    try:
+        from billiard.process import current_process
+    except ImportError:
+        return True
+    return not current_process().daemon
+
+
+def chunk_size_for(rate, seconds, limit):
+    """
+    Размер диапазона, который один процесс проверяет примерно за seconds секунд
+    при скорости rate паролей в секунду, но не больше limit.
+    """
+    return max(1, min(limit, int(rate * seconds)))
+
+
+def _init_worker(archive_path, extraction_dir, hash_value, exhausted, stop_event, unrar_tool):
+    global _checker, _already_checked, _stop_event
+    rarfile.UNRAR_TOOL = unrar_tool
+    # У каждого процесса своя директория, чтобы распаковки не мешали друг другу
+    worker_extraction_dir = os.path.join(extraction_dir, str(os.getpid()))
+    os.makedirs(worker_extraction_dir, exist_ok=True)
+    _checker = make_checker(archive_path, worker_extraction_dir, hash_value)
+    _already_checked = make_exhausted_filter(exhausted)
+    _stop_event = stop_event
+
+
+def _check_batch(candidates):
+    """
+    Проверяет пачку кандидатов одного диапазона индексов (None - индекс без кандидата).
+    Возвращает (найденный пароль или None, число пройденных индексов,
+    число кандидатов, действительно переданных в проверку).
+    """
+    checked = verified = 0
+    for password in candidates:
+        if _stop_event.is_set():
+            break
+        checked += 1
+        if password is None or (_already_checked and _already_checked(password)):
+            continue
+        verified += 1
+        try:
+            if _checker(password):
+                _stop_event.set()
+                return password, checked, verified
+        except Exception as e:
+            logger.warning(f"Ошибка при проверке пароля '{password}': {e}")
+    return None, checked, verified
+
+
+async def brute_force_pool(archive_path, space, start, stop, workers, extraction_dir, on_progress, chunk_size=1000, hash_value=None, exhausted=()):
+    """
+    Перебирает диапазон [start, stop) пространства кандидатов space (см. candidates.make_space)
+    в пуле из workers процессов.
+    on_progress(checked, position, verified) - корутина, вызываемая после каждого проверенного
+    диапазона; position - индекс, до которого все диапазоны уже проверены (диапазоны
+    завершаются не по порядку), verified - сколько кандидатов диапазона передано в проверку. Если корутина возвращает True, перебор прекращается
+    (например, пароль нашёл другой шард).
+    Возвращает найденный пароль или None.
+    """
+    loop = asyncio.get_running_loop()
+    stop_event = multiprocessing.Event()
+    candidates = make_space(space).iter(start, stop)
+    chunks = (
+        (a, min(a + chunk_size, stop), list(islice(candidates, chunk_size)))
+        for a in range(start, stop, chunk_size)
+    )
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(archive_path, extraction_dir, hash_value, exhausted, stop_event, rarfile.UNRAR_TOOL),
+    )
+    # Завершённые, но ещё не примыкающие к границе диапазоны: start -> stop
+    finished = {}
+    frontier = start
+    try:
+        pending = {}
+        # Держим в работе не больше двух диапазонов на процесс, остальные выдаём по мере готовности
+        for chunk_start, chunk_stop, batch in chunks:
+            pending[loop.run_in_executor(executor, _check_batch, batch)] = (chunk_start, chunk_stop)
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                chunk_start, chunk_stop = pending.pop(future)
+                password, checked, verified = future.result()
+                if password:
+                    stop_event.set()
+                    return password
+                finished[chunk_start] = chunk_stop
+                while frontier in finished:
+                    frontier = finished.pop(frontier)
+                if await on_progress(checked, frontier, verified):
+                    stop_event.set()
+                    return None
+            for chunk_start, chunk_stop, batch in chunks:
+                pending[loop.run_in_executor(executor, _check_batch, batch)] = (chunk_start, chunk_stop)
+                if len(pending) >= workers * 2:
+                    break
+        return None
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,114 @@
+"""
+Перебор по словарю с правилами мутации (режим wordlist).
+
+Кандидаты идут в порядке John the Ripper: сначала правило ":" ко всем словам,
+затем следующее правило ко всем словам и т.д. - слова словаря отсортированы по
+частоте, а правила в файлах - по числу попаданий, так что вероятные пароли
+проверяются первыми. Индекс кандидата однозначно задаёт пару (правило, слово):
+    index = rule_index * len(words) + word_index,
+поэтому пространство делится на шарды и продолжается с контрольной точки так же,
+как пространство ключей полного перебора.
+Вместо отброшенных правилом и повторяющихся кандидатов выдаётся None, чтобы
+индексы не сдвигались. Повторы отсекаются в пределах окна из последних
+DEDUP_WINDOW..2*DEDUP_WINDOW кандидатов - память не растёт с размером пространства.
+"""
+import os
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from app.core.endpoints import FastApiServerInfo
+from app.services.rules import load_rules
+
+NAME_RE = re.compile(r"^[\w.+-]+$")
+DEDUP_WINDOW = 1_000_000
+
+
+def wordlist_path(name: str) -> str:
+    if not NAME_RE.match(name or ""):
+        raise ValueError(f"Некорректное имя словаря: {name!r}")
+    path = os.path.join(FastApiServerInfo.WORDLIST_DIR, name)
+    if not os.path.isfile(path):
+        raise ValueError(f"Словарь {name} не найден")
+    return path
+
+
+def rules_path(name: str) -> str:
+    if not NAME_RE.match(name or ""):
+        raise ValueError(f"Некорректное имя набора правил: {name!r}")
+    path = os.path.join(FastApiServerInfo.RULES_DIR, name + ".rule")
+    if not os.path.isfile(path):
+        raise ValueError(f"Набор правил {name} не найден")
+    return path
+
+
+def load_words(path: str) -> List[str]:
+    """
+    Слова словаря в исходном порядке, без комментариев "#!comment:" и повторов.
+    """
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        words = (line.rstrip("\r\n") for line in f if not line.startswith("#!comment:"))
+        return list(dict.fromkeys(word for word in words if word))
+
+
+class _RecentSet:
+    """
+    Множество последних добавленных значений: два поколения по window элементов.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.current = set()
+        self.previous = set()
+
+    def add(self, value) -> bool:
+        """
+        Добавляет значение. Возвращает False, если оно уже встречалось недавно.
+        """
+        if value in self.current or value in self.previous:
+            return False
+        if len(self.current) >= self.window:
+            self.previous, self.current = self.current, set()
+        self.current.add(value)
+        return True
+
+
+class WordlistSpace:
+    def __init__(self, words: Sequence[str], rules: Sequence):
+        self.words = words
+        self.rules = rules
+        self.size = len(words) * len(rules)
+
+    def iter(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Optional[str]]:
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return
+        seen = _RecentSet(DEDUP_WINDOW)
+        count = len(self.words)
+        rule_index, word_index = divmod(start, count)
+        remaining = stop - start
+        while remaining > 0:
+            rule = self.rules[rule_index]
+            batch = min(count - word_index, remaining)
+            for word in islice(self.words, word_index, word_index + batch):
+                candidate = rule(word)
+                yield candidate if candidate and seen.add(candidate) else None
+            remaining -= batch
+            rule_index += 1
+            word_index = 0
+
+
+@lru_cache(maxsize=8)
+def _load(wordlist: str, rules: Tuple[str, ...]) -> WordlistSpace:
+    return WordlistSpace(
+        load_words(wordlist_path(wordlist)),
+        load_rules([rules_path(name) for name in rules])
+    )
+
+
+def make_wordlist_space(wordlist: str, rules: Sequence[str]) -> WordlistSpace:
+    """
+    Словарь и правила загружаются и компилируются один раз на процесс.
+    """
+    return _load(wordlist, tuple(rules))
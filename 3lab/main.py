@@ -3,7 +3,8 @@ import subprocess
 import sys
 import os
 import time
-from app.api.manager import ConnectionManager
+from app.api.manager import manager
+from app.api.notifier import NotificationConsumer
 import redis
 from app.core.endpoints import FastApiServerInfo
 import asyncio
@@ -12,6 +13,7 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect,Depends, status
 import uvicorn
 from app.api import auth
 from app.api import brut
+from app.celery.tasks import job_key
 import redis.asyncio as aioredis
 
 
@@ -48,33 +50,57 @@ app = FastAPI(title="Практикум по программированию")
 async def root():
     return {"message": "Hello World"}
 
-manager = ConnectionManager()
 
 
 @app.on_event("startup")
 async def on_startup():
-    global redis_
-    redis_ = aioredis.Redis(host = 'redis', port = '6379', db = 0, decode_responses=True)
-    asyncio.create_task(notify_loop())
-
-async def notify_loop():
-    global redis_
-    sub = redis_.pubsub()
-    await sub.subscribe('notifications')
-    while True:
-        msg = await sub.get_message(ignore_subscribe_messages=True, timeout=None)
-        if msg and msg["data"]:
-            data = json.loads(msg["data"])
-            await manager.broadcast(data)
-        await asyncio.sleep(0.01)
+    global redis_, notifier
+    await auth.init_db()
+    # health_check_interval позволяет заметить "тихо" оборвавшееся соединение подписки
+    redis_ = aioredis.Redis(
+        host=FastApiServerInfo.REDIS_HOST, port=FastApiServerInfo.REDIS_PORT, db=FastApiServerInfo.REDIS_DB,
+        decode_responses=True, socket_keepalive=True, health_check_interval=30
+    )
+    # Реплика подписана на общий канал и на каналы задач и пользователей своих соединений
+    notifier = NotificationConsumer(redis_, FastApiServerInfo.NOTIFY_CHANNEL, manager.broadcast, channels=manager.channels)
+    manager.on_channels_changed = notifier.channels_changed
+    notifier.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await notifier.stop()
+    await redis_.close()
+    await auth.close_db()
+
+@app.get(FastApiServerInfo.NOTIFY_METRICS)
+async def notify_metrics():
+    return notifier.snapshot()
         
+async def task_owner(task_id):
+    """
+    id пользователя, запустившего задачу, по её описанию в Redis (None - задачи нет).
+    """
+    owner = await redis_.hget(job_key(task_id, "meta"), "user_id")
+    return int(owner) if owner else None
+
 @app.websocket(f"/ws/notifications")
-async def ws_notifications(ws: WebSocket):
+async def ws_notifications(ws: WebSocket, token: str = None):
     await manager.connect(ws)
     try:
+        # С токеном клиент сразу получает уведомления обо всех своих задачах
+        if token:
+            user = await auth.resolve_token(token)
+            if user:
+                manager.set_user(ws, user["id"])
         while True:
-            await ws.receive_text()
+            # Команды подписки: {"action": "subscribe", "task_id": ...} и т.п.
+            await manager.handle_command(
+                ws, await ws.receive_text(), resolve_token=auth.resolve_token, resolve_owner=task_owner
+            )
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Соединение и его подписки освобождаются при любом выходе, не только при разрыве
         manager.disconnect(ws)
 
 